@@ -0,0 +1,182 @@
+# Throughput, peak memory and accuracy of the optical-force and simulation hot paths.
+# Runs without a display. Run from the repository root:
+#   python -m benchmarks.hot_paths --output bench.json
+#   python -m benchmarks.hot_paths --output new.json --baseline bench.json
+# With --baseline, cases whose throughput dropped by more than --threshold are reported as regressions
+# and the exit status is 1.
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+
+import numpy as np
+
+from optical_force import calculate_force_and_torque, generate_rays, momentum_transfer
+from calc_force_and_save import calc_and_save
+
+# Trap parameters in SI units, as used by the real-time simulation
+RADIUS = 5e-6
+W0 = 0.5e-6
+P = 10e-3
+N_MEDIUM = 1.33
+N_PARTICLE = 1.59
+SPHERE_POSITION = np.array([1e-6, 0.5e-6, 2e-6])
+
+
+# Best wall-clock time per call over repeats timings and the peak traced memory of one call.
+# Fast calls are looped (timeit autorange) so each timing lasts at least 0.2 s.
+def measure(function, repeats):
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()  # Also warms up imports and the ray cache
+    times = [seconds / number for seconds in timer.repeat(repeats, number)]
+
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(times), peak
+
+
+def record(results, name, size, unit, seconds, peak, **extra):
+    results.append({
+        'name': name, 'size': size, 'unit': unit, 'seconds': seconds,
+        'throughput': size / seconds, 'peak_memory_mb': peak / 2**20, **extra,
+    })
+    print(f"{name:>28} {size:>9} {size / seconds:>14.3e} {unit + '/s':<12} {peak / 2**20:>10.1f} MB"
+          + "".join(f"  {key}={value:.2e}" for key, value in extra.items()))
+
+
+def bench_generate_rays(results, ray_counts, repeats):
+    for num_rays in ray_counts:
+        seconds, peak = measure(lambda: generate_rays(num_rays, W0, P, rng=0), repeats)
+        record(results, "generate_rays", num_rays, "rays", seconds, peak)
+
+
+def bench_momentum_transfer(results, ray_counts, repeats):
+    for num_rays in ray_counts:
+        _, _, _, ray_directions, _ = generate_rays(num_rays, W0, P, rng=0)
+        # Points on the sphere surface with an outward normal facing the incoming rays
+        sphere_center = np.array([0, 0, 2 * RADIUS])
+        intersection_points = sphere_center - RADIUS * ray_directions
+        seconds, peak = measure(lambda: momentum_transfer(ray_directions, intersection_points, sphere_center,
+                                                          N_MEDIUM, N_PARTICLE), repeats)
+        record(results, "momentum_transfer", num_rays, "rays", seconds, peak)
+
+
+def bench_force(results, ray_counts, repeats, reference):
+    scale = np.linalg.norm(reference)
+    for num_rays in ray_counts:
+        def force():
+            return calculate_force_and_torque(RADIUS, num_rays, W0, P, N_MEDIUM, N_PARTICLE, SPHERE_POSITION,
+                                              rng=0, cache_rays=False)[0]
+        seconds, peak = measure(force, repeats)
+        error = np.linalg.norm(force() - reference) / scale
+        record(results, "calculate_force_and_torque", num_rays, "rays", seconds, peak, relative_error=error)
+
+
+def bench_calc_and_save(results, sweep_sizes, num_rays, repeats):
+    with tempfile.TemporaryDirectory() as save_path:
+        for n_positions in sweep_sizes:
+            # Positions along z in metres, in the same SI units as the radius
+            dict_parameters = {
+                'radius': RADIUS, 'num_rays': num_rays, 'w0': W0, 'P': P, 'n_medium': N_MEDIUM,
+                'n_particle': N_PARTICLE, 'selected_view': 'Z', 'min_point': -5e-6, 'max_point': 5e-6,
+                'step': 10e-6 / (n_positions - 1), 'save_path': save_path, 'seed': 0,
+            }
+
+            def sweep():
+                with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                    calc_and_save(dict_parameters)
+
+            seconds, peak = measure(sweep, repeats)
+            record(results, f"calc_and_save[{num_rays} rays]", n_positions, "positions", seconds, peak)
+
+
+def bench_simulation_step(results, ray_counts, repeats):
+    try:
+        os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+        from pygame_ui.physics_worker import PhysicsWorker
+    except ImportError:
+        print("pygame is not installed; skipping the simulation step")
+        return
+
+    for num_rays in ray_counts:
+        worker = PhysicsWorker(10)
+        # Same parameter snapshot the simulation window hands to its physics thread ("Direct" engine)
+        parameters = {
+            'active': True, 'force_mode': "Laser Trapping Force", 'dt': 0.01, 'viscosity': 1,
+            'temperature': 300, 'radius': 10, 'n_medium': N_MEDIUM, 'n_particle': N_PARTICLE, 'P': P, 'w0': W0,
+            'number_of_rays': num_rays, 'force_field': None, 'cache_rays': True, 'backend': "numpy",
+        }
+        seconds, peak = measure(lambda: worker.step(parameters), repeats)
+        record(results, "simulation_step", 1, "steps", seconds, peak, rays=num_rays)
+
+
+# Compare with a baseline run; returns the cases that slowed down by more than threshold
+def find_regressions(results, baseline, threshold):
+    previous = {(case['name'], case['size'], case.get('rays')): case for case in baseline['results']}
+    regressions = []
+    for case in results:
+        old = previous.get((case['name'], case['size'], case.get('rays')))
+        if old is not None and case['throughput'] < (1 - threshold) * old['throughput']:
+            regressions.append((case, old))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ray-counts", type=int, nargs="+", default=[100, 1000, 10000, 100000, 1000000])
+    parser.add_argument("--sweep-sizes", type=int, nargs="+", default=[10, 100])
+    parser.add_argument("--sweep-rays", type=int, default=1000, help="Rays per position in the calc_and_save sweeps")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed repetitions per case (the best is kept)")
+    parser.add_argument("--reference-rays", type=int, default=2**21)
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON file of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Relative throughput drop reported as a regression")
+    args = parser.parse_args()
+
+    reference, _, _ = calculate_force_and_torque(RADIUS, args.reference_rays, W0, P, N_MEDIUM, N_PARTICLE,
+                                                 SPHERE_POSITION, sampling="sobol", rng=0, cache_rays=False)
+    print(f"Reference force ({args.reference_rays} Sobol rays): {reference} N")
+
+    results = []
+    bench_generate_rays(results, args.ray_counts, args.repeats)
+    bench_momentum_transfer(results, args.ray_counts, args.repeats)
+    bench_force(results, args.ray_counts, args.repeats, reference)
+    bench_calc_and_save(results, args.sweep_sizes, args.sweep_rays, args.repeats)
+    bench_simulation_step(results, [n for n in args.ray_counts if n <= 10000], args.repeats)
+
+    run = {
+        'created': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+        'machine': platform.platform(),
+        'reference_rays': args.reference_rays,
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(run, file, indent=4)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = find_regressions(results, baseline, args.threshold)
+        for case, old in regressions:
+            print(f"REGRESSION {case['name']} size={case['size']}: "
+                  f"{case['throughput']:.3e} vs {old['throughput']:.3e} {case['unit']}/s")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
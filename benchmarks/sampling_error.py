@@ -0,0 +1,52 @@
+# Force error against ray count for each ray sampling strategy.
+# Run from the repository root: python -m benchmarks.sampling_error
+import argparse
+import time
+
+import numpy as np
+
+from optical_force import calculate_force_and_torque, SAMPLING_MODES
+
+# Trap parameters in SI units, as used by the real-time simulation
+RADIUS = 5e-6
+W0 = 0.5e-6
+P = 10e-3
+N_MEDIUM = 1.33
+N_PARTICLE = 1.59
+SPHERE_POSITION = np.array([1e-6, 0.5e-6, 2e-6])
+
+
+def force(num_rays, sampling, rng):
+    F, _, _ = calculate_force_and_torque(RADIUS, num_rays, W0, P, N_MEDIUM, N_PARTICLE, SPHERE_POSITION,
+                                         sampling=sampling, rng=rng)
+    return F
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ray-counts", type=int, nargs="+", default=[100, 300, 1000, 3000, 10000])
+    parser.add_argument("--trials", type=int, default=20, help="Independent repetitions per ray count")
+    parser.add_argument("--reference-rays", type=int, default=2**21)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    seeds = np.random.SeedSequence(args.seed)
+    reference = force(args.reference_rays, "sobol", np.random.default_rng(seeds.spawn(1)[0]))
+    scale = np.linalg.norm(reference)
+    print(f"Reference force ({args.reference_rays} Sobol rays): {reference} N")
+    print(f"{'sampling':>12} {'rays':>8} {'rel. RMS error':>16} {'time/call (ms)':>16}")
+
+    for sampling in SAMPLING_MODES:
+        for num_rays in args.ray_counts:
+            errors = []
+            start = time.perf_counter()
+            for trial_seed in seeds.spawn(args.trials):
+                F = force(num_rays, sampling, np.random.default_rng(trial_seed))
+                errors.append(np.linalg.norm(F - reference) / scale)
+            elapsed = (time.perf_counter() - start) / args.trials
+            rms = np.sqrt(np.mean(np.square(errors)))
+            print(f"{sampling:>12} {num_rays:>8} {rms:>16.3e} {1000 * elapsed:>16.2f}")
+
+
+if __name__ == "__main__":
+    main()
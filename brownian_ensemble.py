@@ -0,0 +1,94 @@
+import math
+
+import numpy as np
+
+from constants import BOLTZMANN_CONSTANT
+from optical_force import calculate_force_and_torque_batch
+from result_io import open_result_array
+
+# Stokes drag coefficient (kg/s) of a sphere; radius in µm, viscosity in mPa·s
+def drag_coefficient(radius, viscosity):
+    radius_meters = radius * 1e-6
+    viscosity_pas = viscosity * 1e-3
+    return 6 * math.pi * viscosity_pas * radius_meters
+
+# Standard deviation (µm) of each component of the Brownian displacement during one time step dt.
+# radius may also be an array of radii.
+def brownian_step_std(radius, dt, temperature, viscosity):
+    D = (BOLTZMANN_CONSTANT * temperature * dt) / drag_coefficient(radius, viscosity)
+    displacement_std = np.sqrt(2 * D * dt)
+    return displacement_std * 1e6
+
+# Many independent spheres in the optical trap, simulated without pygame.
+# Positions are an (N, 3) array in µm. Each step applies the same Brownian displacement and
+# overdamped force response as Sphere in the real-time simulation, for all particles at once.
+# Units follow Sphere.laser_trapping_force: radius in µm, viscosity in mPa·s, P in W and w0 in m.
+class BrownianEnsemble:
+    def __init__(self, n_particles, radius, temperature, viscosity, n_medium, n_particle, P, w0, num_rays,
+                 force_mode="Laser Trapping Force", positions=None, seed=None, sampling="uniform"):
+        self.radius = radius
+        self.temperature = temperature
+        self.viscosity = viscosity
+        self.n_medium = n_medium
+        self.n_particle = n_particle
+        self.P = P
+        self.w0 = w0
+        self.num_rays = num_rays
+        self.force_mode = force_mode
+        self.sampling = sampling
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        if positions is None:
+            self.positions = np.zeros((n_particles, 3))
+        else:
+            self.positions = np.array(positions, dtype=float).reshape(n_particles, 3)
+
+    def brownian_motion(self, dt):
+        std = brownian_step_std(self.radius, dt, self.temperature, self.viscosity)
+        self.positions += self.rng.normal(0, std, self.positions.shape)
+
+    def central_force(self, dt):
+        # Same pull towards the origin as Sphere.central_force
+        length = np.linalg.norm(self.positions, axis=1, keepdims=True)
+        magnitude = np.minimum(length**2 * dt, length)
+        moving = length[:, 0] > 0
+        self.positions[moving] -= (self.positions[moving] / length[moving]) * magnitude[moving]
+
+    def laser_trapping_force(self, dt):
+        gamma = drag_coefficient(self.radius, self.viscosity)
+        F, _ = calculate_force_and_torque_batch(self.radius * 1e-6, self.num_rays, self.w0, self.P,
+                                                self.n_medium, self.n_particle, self.positions * 1e-6,
+                                                sampling=self.sampling, rng=self.seed)
+        self.positions += (F / gamma) * dt * 1e6
+
+    def step(self, dt):
+        self.brownian_motion(dt)
+        if self.force_mode == "Central Force":
+            self.central_force(dt)
+        elif self.force_mode == "Laser Trapping Force":
+            self.laser_trapping_force(dt)
+
+    # Run n_steps steps of length dt and return the final positions.
+    # With trajectory_path the positions of every save_every-th step (and the initial ones) are
+    # streamed into a memory-mapped (frames, N, 3) array trajectory_path.npy with a JSON sidecar.
+    def run(self, n_steps, dt, trajectory_path=None, save_every=1):
+        trajectory = None
+        if trajectory_path is not None:
+            n_frames = n_steps // save_every + 1
+            metadata = {
+                'radius': np.asarray(self.radius).tolist(), 'temperature': self.temperature,
+                'viscosity': self.viscosity, 'n_medium': self.n_medium,
+                'n_particle': np.asarray(self.n_particle).tolist(), 'P': self.P, 'w0': self.w0,
+                'num_rays': self.num_rays, 'force_mode': self.force_mode, 'sampling': self.sampling,
+                'seed': self.seed, 'dt': dt, 'save_every': save_every, 'units': 'µm',
+            }
+            trajectory = open_result_array(trajectory_path, (n_frames, len(self.positions), 3), metadata)
+            trajectory[0] = self.positions
+
+        for i in range(1, n_steps + 1):
+            self.step(dt)
+            if trajectory is not None and i % save_every == 0:
+                trajectory[i // save_every] = self.positions
+                trajectory.flush()
+
+        return self.positions
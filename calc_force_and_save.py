@@ -1,7 +1,150 @@
+import importlib.util
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
 import numpy as np
 from tqdm.auto import tqdm
-from optical_force import calculate_force_and_torque
+from optical_force import calculate_force_and_torque_batch, SAMPLING_MODES, POWER_THRESHOLD, BACKEND_NAMES
+from result_io import open_result_array, ResultWriter, export_csv
+
+# Number of sweep positions per task of the parallel sweep. It does not depend on the number of
+# workers, so the random stream of each position (and the result of a seeded sweep) does not either.
+SWEEP_CHUNK_SIZE = 16
+# Number of positions computed and written at a time by the volumetric force map
+MAP_BLOCK_SIZE = 4096
+
+# Compute one chunk of sweep positions with its own random stream (task of the parallel sweep)
+def sweep_chunk(chunk_index, sphere_positions, physical_parameters, sampling, seed_sequence, trace_options):
+    rng = np.random.default_rng(seed_sequence)
+    F, Torque = calculate_force_and_torque_batch(*physical_parameters, sphere_positions, sampling=sampling, rng=rng,
+                                                 **(trace_options or {}))
+    return chunk_index, F, Torque
+
+# Independent random streams of n_chunks sweep chunks, spawned from seed (an integer, None or a SeedSequence)
+def chunk_seed_sequences(seed, n_chunks):
+    root = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    return root.spawn(n_chunks)
+
+# Split the sweep positions into chunks and compute them on a process pool.
+# Every chunk gets an independent random stream from chunk_seed_sequences.
+# trace_options are passed on to calculate_force_and_torque_batch (e.g. multiple_scattering).
+# Yields (start, F, Torque) for every chunk in completion order.
+def parallel_sweep(sphere_positions, physical_parameters, sampling, seed, workers, chunk_size=SWEEP_CHUNK_SIZE,
+                   trace_options=None):
+    starts = range(0, len(sphere_positions), chunk_size)
+    seed_sequences = chunk_seed_sequences(seed, len(starts))
+    
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(sweep_chunk, i, sphere_positions[start:start + chunk_size],
+                                   physical_parameters, sampling, seed_sequence, trace_options)
+                   for i, (start, seed_sequence) in enumerate(zip(starts, seed_sequences))]
+        for future in as_completed(futures):
+            i, F_chunk, Torque_chunk = future.result()
+            yield starts[i], F_chunk, Torque_chunk
+
+# Force and torque for an array of sphere positions, chunk by chunk, in this process or on a process pool.
+# A seeded sweep draws every chunk from the same stream in both cases, so its output does not depend
+# on workers. Unseeded in-process sweeps share one (cached) ray bundle between all chunks.
+# Yields (start, F, Torque) for every chunk as soon as it is computed.
+def sweep_forces(sphere_positions, physical_parameters, sampling, seed, cache_rays, workers, chunk_size,
+                 trace_options=None):
+    if workers > 1:
+        yield from parallel_sweep(sphere_positions, physical_parameters, sampling, seed, workers, chunk_size,
+                                  trace_options)
+        return
+    starts = range(0, len(sphere_positions), chunk_size)
+    if seed is not None:
+        for start, seed_sequence in zip(starts, chunk_seed_sequences(seed, len(starts))):
+            _, F, Torque = sweep_chunk(0, sphere_positions[start:start + chunk_size], physical_parameters, sampling,
+                                       seed_sequence, trace_options)
+            yield start, F, Torque
+        return
+    for start in starts:
+        F, Torque = calculate_force_and_torque_batch(*physical_parameters, sphere_positions[start:start + chunk_size],
+                                                     sampling=sampling, cache_rays=cache_rays,
+                                                     **(trace_options or {}))
+        yield start, F, Torque
+
+# Compute force and torque on a 2D plane or 3D box of sphere positions.
+# The results are written block by block into a memory-mapped ForceMap_{axis}.npy array of shape
+# (len(x), len(y), len(z), 6) holding Fx, Fy, Fz, Tx, Ty, Tz, next to a ForceMap_{axis}.json sidecar
+# with the simulation parameters and the grid axes. grid_axes holds the x, y and z values of the grid;
+# axes that are not varied hold a single value.
+def save_force_map(axis, grid_axes, physical_parameters, sampling, seed, cache_rays, workers, chunk_size, save_path,
+                   trace_options=None, block_size=MAP_BLOCK_SIZE):
+    shape = tuple(len(grid_axis) for grid_axis in grid_axes)
+    radius, num_rays, w0, P, n_medium, n_particle = physical_parameters
+    metadata = {
+        'radius': radius, 'num_rays': num_rays, 'w0': w0, 'P': P, 'n_medium': n_medium, 'n_particle': n_particle,
+        'sampling': sampling, 'seed': seed, 'selected_view': axis, **(trace_options or {}),
+        'x': grid_axes[0].tolist(), 'y': grid_axes[1].tolist(), 'z': grid_axes[2].tolist(),
+        'columns': ['Fx', 'Fy', 'Fz', 'Tx', 'Ty', 'Tz'],
+    }
+    force_map = open_result_array(f"{save_path}ForceMap_{axis}", shape + (6,), metadata)
+    rows = force_map.reshape(-1, 6)  # View of the memory map with one row per position
+    
+    total = rows.shape[0]
+    # Blocks of a seeded map get their own random streams, in this process and on a process pool alike
+    block_seeds = np.random.SeedSequence(seed).spawn(int(np.ceil(total / block_size))) if seed is not None else None
+    with tqdm(total=total, position=0, leave=True) as progress:
+        for block, block_start in enumerate(range(0, total, block_size)):
+            index = np.unravel_index(np.arange(block_start, min(block_start + block_size, total)), shape)
+            sphere_positions = np.stack([grid_axis[i] for grid_axis, i in zip(grid_axes, index)], axis=-1)
+            block_seed = seed if block_seeds is None else block_seeds[block]
+            for start, F, Torque in sweep_forces(sphere_positions, physical_parameters, sampling, block_seed,
+                                                 cache_rays, workers, chunk_size, trace_options):
+                rows[block_start + start:block_start + start + len(F)] = np.hstack((F, Torque))
+                progress.update(len(F))
+            force_map.flush()
+    
+    return force_map
 
+# Adaptive single-axis sweep. Starting from the coarse sphere_positions, the intervals where the force
+# changes between neighbours, or bends (second difference), by more than tolerance times the largest
+# force of the curve are bisected, worst first, until no interval needs refinement, intervals
+# reach min_step or max_evaluations positions have been computed.
+# Returns the positions sorted along the axis with their forces and torques.
+def adaptive_sweep(sphere_positions, axis_index, physical_parameters, sampling, seed, cache_rays, workers,
+                   chunk_size, trace_options, tolerance, max_evaluations, min_step):
+    def evaluate(positions):
+        F = np.empty((len(positions), 3))
+        Torque = np.empty((len(positions), 3))
+        for start, F_chunk, Torque_chunk in sweep_forces(positions, physical_parameters, sampling, seed, cache_rays,
+                                                         workers, chunk_size, trace_options):
+            F[start:start + len(F_chunk)] = F_chunk
+            Torque[start:start + len(Torque_chunk)] = Torque_chunk
+        return F, Torque
+    
+    positions = sphere_positions
+    F, Torque = evaluate(positions)
+    with tqdm(total=max(max_evaluations, len(positions)), initial=len(positions), position=0, leave=True) as progress:
+        while len(positions) < max_evaluations:
+            scale = np.abs(F).max()
+            if len(positions) < 2 or scale == 0:
+                break
+            jump = np.linalg.norm(np.diff(F, axis=0), axis=1) / scale
+            curvature = np.zeros(len(positions))
+            curvature[1:-1] = np.linalg.norm(F[:-2] - 2 * F[1:-1] + F[2:], axis=1) / scale
+            score = np.maximum(jump, np.maximum(curvature[:-1], curvature[1:]))
+            width = np.diff(positions[:, axis_index])
+            
+            candidates = np.flatnonzero((score > tolerance) & (width / 2 >= min_step))
+            if len(candidates) == 0:
+                break
+            candidates = candidates[np.argsort(score[candidates])[::-1][:max_evaluations - len(positions)]]
+            
+            midpoints = (positions[candidates] + positions[candidates + 1]) / 2
+            F_new, Torque_new = evaluate(midpoints)
+            positions = np.concatenate((positions, midpoints))
+            F = np.concatenate((F, F_new))
+            Torque = np.concatenate((Torque, Torque_new))
+            order = np.argsort(positions[:, axis_index], kind="stable")
+            positions, F, Torque = positions[order], F[order], Torque[order]
+            progress.update(len(midpoints))
+    
+    return positions, F, Torque
+
+# Compute the sweep or force map described by dict_parameters and save it.
+# Returns True once the results are saved; invalid parameters are reported and None is returned.
 def calc_and_save(dict_parameters: dict):
     for i in  dict_parameters:
         if dict_parameters[i] == None:
@@ -14,11 +157,40 @@ def calc_and_save(dict_parameters: dict):
     P = dict_parameters['P']
     n_medium = dict_parameters['n_medium']
     n_particle = dict_parameters['n_particle']
+    # Ray sampling strategy and optional seed for reproducible rays
+    sampling = dict_parameters.get('sampling', 'uniform')
+    seed = dict_parameters.get('seed')
+    # Reuse the cached ray bundle for unchanged beam parameters unless fresh rays are requested
+    cache_rays = dict_parameters.get('cache_rays', True)
+    # Number of worker processes (1 runs the sweep in this process) and positions per task
+    workers = dict_parameters.get('workers', 1)
+    chunk_size = dict_parameters.get('chunk_size', SWEEP_CHUNK_SIZE)
+    # Optional multiple scattering: rays are followed through internal reflections
+    # until their power drops below power_threshold of the incoming power
+    trace_options = {
+        'multiple_scattering': dict_parameters.get('multiple_scattering', False),
+        'power_threshold': dict_parameters.get('power_threshold', POWER_THRESHOLD),
+        # Compute backend of the ray trace ('numpy' or 'numba'; falls back to NumPy if unavailable)
+        'backend': dict_parameters.get('backend', 'numpy'),
+    }
+    # Adaptive refinement of single-axis sweeps: the step defines the coarse grid
+    adaptive = dict_parameters.get('adaptive', False)
+    tolerance = dict_parameters.get('tolerance', 0.05)
+    max_evaluations = dict_parameters.get('max_evaluations', 200)
+    # Results are always written as .npy; 'csv' additionally converts them to CSV
+    output_format = dict_parameters.get('output_format', 'npy')
     # Axis
     axis = dict_parameters['selected_view']
-    # Min and max points of the simulation
+    # Plane and box views: optional bounds {'X': [min, max], ...} of the varied axes (min_point..max_point
+    # by default) and the [x, y, z] coordinates used for the axes that are not varied (0 by default)
+    axis_ranges = dict_parameters.get('axis_ranges', {})
+    offset = dict_parameters.get('offset', [0, 0, 0])
+    # Min and max points of the simulation and the step between points
     min_point = dict_parameters['min_point']
     max_point = dict_parameters['max_point']
+    step = dict_parameters.get('step', 0.5)
+    # Smallest interval the adaptive refinement may create
+    min_step = dict_parameters.get('min_step', step / 64)
     # Path to save the simulation
     save_path = dict_parameters['save_path']
     if save_path == "":
@@ -30,8 +202,60 @@ def calc_and_save(dict_parameters: dict):
         print("Max point must be greater than Min point")
         return None
     
+    for name, bounds in axis_ranges.items():
+        if name not in "XYZ" or len(bounds) != 2 or bounds[1] < bounds[0]:
+            print(f"Invalid range {bounds} for axis {name}. Use 'X', 'Y' or 'Z': [min, max] with max >= min.")
+            return None
+    
+    if len(offset) != 3:
+        print("Offset must hold the three coordinates x, y, z")
+        return None
+    
+    if output_format not in ('npy', 'csv'):
+        print("Invalid output format. Choose 'npy' or 'csv'.")
+        return None
+    
+    if step <= 0:
+        print("Step must be positive")
+        return None
+    
+    if sampling not in SAMPLING_MODES:
+        print(f"Invalid sampling mode. Choose one of {SAMPLING_MODES}.")
+        return None
+    
+    if sampling == "sobol" and importlib.util.find_spec("scipy") is None:
+        print("Sobol sampling requires scipy (pip install scipy)")
+        return None
+    
+    if trace_options['backend'] not in BACKEND_NAMES:
+        print(f"Invalid compute backend. Choose one of {BACKEND_NAMES}.")
+        return None
+    
     # Create points to vary the sphere position
-    points = np.arange(min_point, max_point+0.5, 0.5)
+    points = np.arange(min_point, max_point+step, step)
+    physical_parameters = (radius, num_rays, w0, P, n_medium, n_particle)
+    
+    # Volumetric force map on a plane ('XY', 'XZ', 'YZ') or a box ('XYZ')
+    if axis in ('XY', 'XZ', 'YZ', 'XYZ'):
+        if adaptive:
+            print("Adaptive refinement is only available for single-axis sweeps")
+            return None
+        grid_axes = []
+        for i, name in enumerate("XYZ"):
+            if name not in axis:
+                grid_axes.append(np.array([offset[i]], dtype=float))
+            elif name in axis_ranges:
+                low, high = axis_ranges[name]
+                grid_axes.append(np.arange(low, high + step, step))
+            else:
+                grid_axes.append(points)
+        save_force_map(axis, grid_axes, physical_parameters, sampling, seed, cache_rays, workers, chunk_size,
+                       save_path, trace_options)
+        if output_format == 'csv':
+            export_csv(f"{save_path}ForceMap_{axis}")
+        print("Results saved successfully")
+        return True
+    
     # Create sphere_positions based on the chosen axis
     match axis:
         case 'X':
@@ -41,23 +265,39 @@ def calc_and_save(dict_parameters: dict):
         case 'Z':
             sphere_positions = np.asarray([[0, 0, z] for z in points])
         case _:
-            print("Invalid axis to vary. Choose 'X', 'Y', or 'Z'.")
-    
-    # Initialize the results lists
-    F_result = []
-    Torque_result = []
-    
-    # Calculate the force and torque for each sphere position
-    for position in tqdm(sphere_positions, position=0, leave=True):
-        F, Torque, _ = calculate_force_and_torque(radius, num_rays, w0, P, n_medium, n_particle, position)
-        F_result.append(np.insert(F, 0, position))
-        Torque_result.append(np.insert(Torque, 0, position))
-
-    # make Force and Torque as numpy arrays
-    F_result = np.asarray(F_result)
-    Torque_result = np.asarray(Torque_result)
-    
-    # Save the results
-    np.savetxt(f"{save_path}F_{axis}.csv", F_result, delimiter=",")
-    np.savetxt(f"{save_path}Torque_{axis}.csv", Torque_result, delimiter=",")
-    print("Results saved successfully")
\ No newline at end of file
+            print("Invalid axis to vary. Choose 'X', 'Y', 'Z', 'XY', 'XZ', 'YZ' or 'XYZ'.")
+            return None
+    
+    if adaptive:
+        # The refined positions are only known at the end, so all rows are written at once
+        sphere_positions, F, Torque = adaptive_sweep(sphere_positions, "XYZ".index(axis), physical_parameters,
+                                                     sampling, seed, cache_rays, workers, chunk_size, trace_options,
+                                                     tolerance, max_evaluations, min_step)
+        results = [(0, F, Torque)]
+    else:
+        results = sweep_forces(sphere_positions, physical_parameters, sampling, seed, cache_rays, workers,
+                               chunk_size, trace_options)
+    
+    # Write the results in binary form as they are computed; F and Torque files hold the sphere
+    # position in the first three columns. The JSON header keeps all simulation parameters.
+    header = {key: value for key, value in dict_parameters.items() if key != 'save_path'}
+    F_writer = ResultWriter(f"{save_path}F_{axis}", len(sphere_positions), ['x', 'y', 'z', 'Fx', 'Fy', 'Fz'], header)
+    Torque_writer = ResultWriter(f"{save_path}Torque_{axis}", len(sphere_positions),
+                                 ['x', 'y', 'z', 'Tx', 'Ty', 'Tz'], header)
+    
+    # Calculate the force and torque for all sphere positions
+    with tqdm(total=len(sphere_positions), position=0, leave=True) as progress:
+        for start, F, Torque in results:
+            positions = sphere_positions[start:start + len(F)]
+            F_writer.write(start, np.hstack((positions, F)))
+            Torque_writer.write(start, np.hstack((positions, Torque)))
+            progress.update(len(F))
+    F_writer.close()
+    Torque_writer.close()
+    
+    # Optionally convert the results to CSV
+    if output_format == 'csv':
+        export_csv(f"{save_path}F_{axis}")
+        export_csv(f"{save_path}Torque_{axis}")
+    print("Results saved successfully")
+    return True
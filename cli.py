@@ -0,0 +1,237 @@
+# Headless command-line entry point for force calculations, without pygame:
+#   python cli.py sweep --axis Z --min-point=-5e-6 --max-point 5e-6 --step 1e-7 --save-path results
+#   python cli.py sweep --axis XY --min-point=-2e-6 --max-point 2e-6 --y-range=-1e-6,1e-6 --offset=0,0,-3e-6 --step 1e-7
+#   python cli.py stiffness --position=0,0,-2.8e-6 --output stiffness.json
+#   python cli.py equilibrium --z0 0 --sampling sobol
+#   python cli.py batch jobs.json
+#   python cli.py campaign campaign.json
+# Negative values in scientific notation must be attached with "=" (argparse reads "-5e-6" as an option).
+# Parameters can also come from a JSON config file (--config) with the same keys as calc_and_save, but in
+# SI units (the calculation window enters lengths in µm); command-line values override it. A batch file holds {"defaults": {...}, "jobs": [{"job": "sweep", ...}, ...]}
+# (or just the list of jobs) and runs all jobs in one process. A campaign file holds
+# {"base": {...}, "grid": {"radius": [...], ...}, "cache_dir": ..., "max_size_mb": ...}; every grid cell is
+# a sweep that is only computed if its result is not in the on-disk result cache yet.
+# Only NumPy and optical_force are imported at startup; the sweep machinery and tqdm load on first use.
+import argparse
+import json
+import sys
+
+import numpy as np
+
+from optical_force import SAMPLING_MODES, BACKEND_NAMES, trap_stiffness, find_equilibrium
+
+JOB_TYPES = ("sweep", "stiffness", "equilibrium")
+
+# Beam and particle parameters (SI units) used when neither the config nor the command line sets them
+DEFAULTS = {
+    'radius': 5e-6,
+    'num_rays': 1000,
+    'w0': 0.5e-6,
+    'P': 10e-3,
+    'n_medium': 1.33,
+    'n_particle': 1.59,
+    'sampling': 'uniform',
+}
+
+# Optional keys passed on to trap_stiffness / find_equilibrium when they are set
+TRACE_OPTIONS = ('multiple_scattering', 'power_threshold')
+
+# Keys every sweep must set; calc_and_save's default step is meant for the µm values of the calculation window
+SWEEP_KEYS = ('selected_view', 'min_point', 'max_point', 'step')
+
+
+def physical_parameters(job):
+    return (job['radius'], job['num_rays'], job['w0'], job['P'], job['n_medium'], job['n_particle'])
+
+
+def run_sweep(job):
+    from calc_force_and_save import calc_and_save
+
+    for key in SWEEP_KEYS:
+        if key not in job:
+            raise ValueError(f"Parameter {key} is missing")
+    dict_parameters = {key: value for key, value in job.items() if key not in ('job', 'output')}
+    dict_parameters.setdefault('save_path', "")
+    # --x-range and friends set the bounds of single axes of plane and box views
+    axis_ranges = dict(dict_parameters.get('axis_ranges', {}))
+    for name in "XYZ":
+        if f"{name.lower()}_range" in dict_parameters:
+            axis_ranges[name] = dict_parameters.pop(f"{name.lower()}_range")
+    if axis_ranges:
+        dict_parameters['axis_ranges'] = axis_ranges
+    if not calc_and_save(dict_parameters):
+        raise ValueError("Sweep parameters were rejected")
+    return None
+
+
+def run_stiffness(job):
+    options = {key: job[key] for key in TRACE_OPTIONS + ('step_fraction', 'rtol', 'max_halvings') if key in job}
+    kappa, kappa_err = trap_stiffness(*physical_parameters(job), np.array(job.get('position', [0, 0, 0]), dtype=float),
+                                      sampling=job['sampling'], rng=job.get('seed'), **options)
+    return {'kappa': kappa.tolist(), 'kappa_err': kappa_err.tolist()}
+
+
+def run_equilibrium(job):
+    options = {key: job[key] for key in TRACE_OPTIONS + ('x0', 'y0', 'z0', 'xtol', 'max_evaluations') if key in job}
+    position, F, n_evaluations = find_equilibrium(*physical_parameters(job), sampling=job['sampling'],
+                                                  rng=job.get('seed'), **options)
+    return {'position': position.tolist(), 'F': F.tolist(), 'n_evaluations': n_evaluations}
+
+
+# Run one job dict; stiffness and equilibrium results are printed and optionally written to job['output']
+def run_job(job):
+    job = {**DEFAULTS, **job}
+    if job['sampling'] not in SAMPLING_MODES:
+        raise ValueError(f"Invalid sampling mode. Choose one of {SAMPLING_MODES}.")
+    match job.get('job'):
+        case "sweep":
+            result = run_sweep(job)
+        case "stiffness":
+            result = run_stiffness(job)
+        case "equilibrium":
+            result = run_equilibrium(job)
+        case other:
+            raise ValueError(f"Unknown job type {other!r}. Choose one of {JOB_TYPES}.")
+
+    if result is not None:
+        print(json.dumps(result))
+        if job.get('output'):
+            with open(job['output'], "w") as file:
+                json.dump({'parameters': job, 'result': result}, file, indent=4)
+    return result
+
+
+# Run all jobs of a batch file; a failing job is reported and the remaining jobs still run
+def run_batch(path):
+    with open(path) as file:
+        batch = json.load(file)
+    if isinstance(batch, list):
+        batch = {'jobs': batch}
+    defaults = batch.get('defaults', {})
+
+    failed = 0
+    for i, job in enumerate(batch['jobs']):
+        print(f"Job {i + 1}/{len(batch['jobs'])}: {job.get('job')}")
+        try:
+            run_job({**defaults, **job})
+        except (ValueError, KeyError, OSError, RuntimeError) as error:
+            print(f"Job {i + 1} failed: {error}")
+            failed += 1
+    return failed
+
+
+# Run the sweeps of a campaign file through the on-disk result cache
+def run_campaign_file(path):
+    from result_cache import ResultCache, CACHE_DIR, CACHE_MAX_BYTES, run_campaign
+
+    with open(path) as file:
+        campaign = json.load(file)
+    base = {**DEFAULTS, **campaign.get('base', {})}
+    grid = campaign.get('grid', {})
+    for key in SWEEP_KEYS:
+        if key not in base and key not in grid:
+            raise ValueError(f"Parameter {key} is missing")
+    max_bytes = campaign['max_size_mb'] * 2**20 if 'max_size_mb' in campaign else CACHE_MAX_BYTES
+    cache = ResultCache(campaign.get('cache_dir', CACHE_DIR), max_bytes)
+    results = run_campaign(base, grid, cache)
+    return sum(result_path is None for _, result_path, _ in results)
+
+
+def position_argument(text):
+    position = [float(value) for value in text.split(",")]
+    if len(position) != 3:
+        raise argparse.ArgumentTypeError("expected three comma-separated values x,y,z")
+    return position
+
+
+def range_argument(text):
+    bounds = [float(value) for value in text.split(",")]
+    if len(bounds) != 2:
+        raise argparse.ArgumentTypeError("expected two comma-separated values min,max")
+    return bounds
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Headless optical-trap force calculations")
+    subparsers = parser.add_subparsers(dest="job", required=True)
+
+    # Options shared by all single jobs; None means "not given", so the config file or DEFAULTS apply
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--config", help="JSON file with job parameters")
+    common.add_argument("--radius", type=float, help="Sphere radius (m)")
+    common.add_argument("--num-rays", dest="num_rays", type=int)
+    common.add_argument("--w0", type=float, help="Beam waist (m)")
+    common.add_argument("--power", dest="P", type=float, help="Laser power (W)")
+    common.add_argument("--n-medium", dest="n_medium", type=float)
+    common.add_argument("--n-particle", dest="n_particle", type=float)
+    common.add_argument("--sampling", choices=SAMPLING_MODES)
+    common.add_argument("--seed", type=int)
+    common.add_argument("--multiple-scattering", dest="multiple_scattering", action="store_const", const=True)
+    common.add_argument("--power-threshold", dest="power_threshold", type=float)
+
+    sweep = subparsers.add_parser("sweep", parents=[common], help="Force and torque along an axis, plane or box")
+    sweep.add_argument("--axis", dest="selected_view", choices=["X", "Y", "Z", "XY", "XZ", "YZ", "XYZ"])
+    sweep.add_argument("--min-point", dest="min_point", type=float)
+    sweep.add_argument("--max-point", dest="max_point", type=float)
+    sweep.add_argument("--step", type=float)
+    for name in "xyz":
+        sweep.add_argument(f"--{name}-range", dest=f"{name}_range", type=range_argument,
+                           help=f"Bounds min,max (m) of {name} in plane and box views (default: min/max point)")
+    sweep.add_argument("--offset", type=position_argument,
+                       help="Coordinates x,y,z (m) of the axes that plane views do not vary (default: 0,0,0)")
+    sweep.add_argument("--save-path", dest="save_path")
+    sweep.add_argument("--workers", type=int)
+    sweep.add_argument("--chunk-size", dest="chunk_size", type=int)
+    sweep.add_argument("--adaptive", action="store_const", const=True)
+    sweep.add_argument("--tolerance", type=float)
+    sweep.add_argument("--max-evaluations", dest="max_evaluations", type=int)
+    sweep.add_argument("--output-format", dest="output_format", choices=["npy", "csv"])
+    sweep.add_argument("--backend", choices=BACKEND_NAMES, help="Compute backend of the ray trace")
+
+    stiffness = subparsers.add_parser("stiffness", parents=[common], help="Trap stiffness around a position")
+    stiffness.add_argument("--position", type=position_argument, help="Sphere position x,y,z (m)")
+    stiffness.add_argument("--step-fraction", dest="step_fraction", type=float)
+    stiffness.add_argument("--rtol", type=float)
+    stiffness.add_argument("--output", help="Write the result to this JSON file")
+
+    equilibrium = subparsers.add_parser("equilibrium", parents=[common], help="Axial equilibrium position")
+    for name in ("x0", "y0", "z0"):
+        equilibrium.add_argument(f"--{name}", type=float, help="Starting position (m)")
+    equilibrium.add_argument("--xtol", type=float)
+    equilibrium.add_argument("--max-evaluations", dest="max_evaluations", type=int)
+    equilibrium.add_argument("--output", help="Write the result to this JSON file")
+
+    batch = subparsers.add_parser("batch", help="Run all jobs of a JSON batch file")
+    batch.add_argument("file")
+
+    campaign = subparsers.add_parser("campaign", help="Run a parameter-grid campaign through the result cache")
+    campaign.add_argument("file")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.job == "batch":
+        return 1 if run_batch(args.file) else 0
+    if args.job == "campaign":
+        try:
+            return 1 if run_campaign_file(args.file) else 0
+        except (ValueError, KeyError) as error:
+            print(f"Campaign failed: {error}")
+            return 1
+
+    job = {}
+    if args.config:
+        with open(args.config) as file:
+            job.update(json.load(file))
+    job.update({key: value for key, value in vars(args).items() if value is not None and key != 'config'})
+    try:
+        run_job(job)
+    except (ValueError, KeyError, RuntimeError) as error:
+        print(f"Job failed: {error}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
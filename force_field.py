@@ -0,0 +1,115 @@
+from collections import OrderedDict
+
+import numpy as np
+
+from optical_force import calculate_force_and_torque, calculate_force_and_torque_batch
+
+# Corners of a unit grid cell, in the same order as the trilinear weights below
+CELL_CORNERS = np.array([[i, j, k] for i in (0, 1) for j in (0, 1) for k in (0, 1)])
+
+# Force and torque on a 3D grid around the beam focus, answered by trilinear interpolation.
+# The grid is split into cubic tiles of tile_size**3 nodes that are ray traced only when
+# a query first lands in them. The whole grid is dropped when the optical parameters change.
+class ForceField:
+    def __init__(self, spacing_fraction=0.05, tile_size=4, beam_focus=np.array([0, 0, 0])):
+        self.spacing_fraction = spacing_fraction  # Grid spacing as a fraction of the sphere radius
+        self.tile_size = tile_size  # Number of grid nodes along each edge of a tile
+        self.beam_focus = np.asarray(beam_focus, dtype=float)
+        self.parameters = None
+        self.spacing = None
+        self.tiles = {}
+        self.backend = "numpy"
+
+    # backend selects the compute backend of the tiles traced by this call (see optical_force.get_backend)
+    def __call__(self, radius, num_rays, w0, P, n_medium, n_particle, sphere_position, backend="numpy"):
+        parameters = (radius, num_rays, w0, P, n_medium, n_particle)
+        if parameters != self.parameters:
+            self.reset(parameters)
+        self.backend = backend
+        return self.query(sphere_position)
+
+    def reset(self, parameters=None):
+        # Throw the grid away; it is refilled lazily for the new parameters
+        self.parameters = parameters
+        self.spacing = None if parameters is None else self.spacing_fraction * parameters[0]
+        self.tiles = {}
+
+    def query(self, sphere_position):
+        # Grid coordinates of the position relative to the focus
+        g = (np.asarray(sphere_position, dtype=float) - self.beam_focus) / self.spacing
+        cell = np.floor(g).astype(int)
+        fx, fy, fz = g - cell
+
+        # Trilinear weights of the 8 cell corners
+        wx = np.array([1 - fx, fx])
+        wy = np.array([1 - fy, fy])
+        wz = np.array([1 - fz, fz])
+        weights = (wx[:, None, None] * wy[None, :, None] * wz[None, None, :]).ravel()
+
+        values = np.array([self.node_value(cell + corner) for corner in CELL_CORNERS])
+        F, torque = np.split(weights @ values, 2)
+        return F, torque
+
+    def node_value(self, node):
+        # Force and torque stored at a grid node, tracing its tile if needed
+        tile_key = tuple(node // self.tile_size)
+        tile = self.tiles.get(tile_key)
+        if tile is None:
+            tile = self.compute_tile(tile_key)
+            self.tiles[tile_key] = tile
+        i, j, k = node % self.tile_size
+        return tile[i, j, k]
+
+    def compute_tile(self, tile_key):
+        radius, num_rays, w0, P, n_medium, n_particle = self.parameters
+        local = np.arange(self.tile_size)
+        nodes = np.stack(np.meshgrid(local, local, local, indexing="ij"), axis=-1).reshape(-1, 3)
+        nodes = nodes + np.asarray(tile_key) * self.tile_size
+        positions = nodes * self.spacing + self.beam_focus
+
+        F, torque = calculate_force_and_torque_batch(radius, num_rays, w0, P, n_medium, n_particle, positions,
+                                                     beam_focus=self.beam_focus, backend=self.backend)
+        return np.hstack((F, torque)).reshape(self.tile_size, self.tile_size, self.tile_size, 6)
+
+
+# Memoized force evaluation with the same call signature as ForceField.
+# Positions are snapped to a cubic lattice with the given resolution (m) and the force is traced at the
+# lattice point, so every query within the same cell is a dictionary lookup. At most max_entries
+# (position, optical parameters) results are kept; the least recently used ones are evicted first.
+class ForceMemo:
+    def __init__(self, resolution=5e-9, max_entries=4096, beam_focus=np.array([0, 0, 0])):
+        self.resolution = resolution
+        self.max_entries = max_entries
+        self.beam_focus = np.asarray(beam_focus, dtype=float)
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, radius, num_rays, w0, P, n_medium, n_particle, sphere_position, backend="numpy"):
+        cell = np.round((np.asarray(sphere_position, dtype=float) - self.beam_focus) / self.resolution).astype(int)
+        key = (tuple(cell.tolist()), radius, num_rays, w0, P, n_medium, n_particle)
+        value = self.cache.get(key)
+        if value is not None:
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        position = cell * self.resolution + self.beam_focus
+        F, torque, _ = calculate_force_and_torque(radius, num_rays, w0, P, n_medium, n_particle, position,
+                                                  beam_focus=self.beam_focus, return_intersections=False,
+                                                  backend=backend)
+        value = (F, torque)
+        self.cache[key] = value
+        while len(self.cache) > self.max_entries:
+            self.cache.popitem(last=False)
+        return value
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def clear(self):
+        self.cache.clear()
+        self.hits = 0
+        self.misses = 0
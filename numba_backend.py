@@ -0,0 +1,78 @@
+import math
+
+import numba
+import numpy as np
+
+from constants import SPEED_OF_LIGHT
+from optical_force import POWER_THRESHOLD, MAX_RAY_POSITION_PAIRS, numpy_trace_sum, register_backend
+
+# Numba compute backend: intersection, Fresnel coefficients and momentum transfer of every
+# (sphere, ray) pair fused into one parallel loop that accumulates the force and torque directly,
+# without temporary arrays. It follows trace_rays step by step for single scattering;
+# multiple scattering is delegated to the NumPy backend.
+@numba.njit(parallel=True, cache=True)
+def trace_sum_kernel(radius, ray_directions, ray_power, n_medium, n_particle, sphere_centers, r0, F, torque):
+    eta = n_medium / n_particle
+    momentum = n_medium / SPEED_OF_LIGHT
+    for i in range(sphere_centers.shape[0]):
+        cx, cy, cz = sphere_centers[i, 0], sphere_centers[i, 1], sphere_centers[i, 2]
+        ox, oy, oz = r0[0] - cx, r0[1] - cy, r0[2] - cz
+        c = ox * ox + oy * oy + oz * oz - radius * radius
+        fx = fy = fz = 0.0
+        tx = ty = tz = 0.0
+        for j in numba.prange(ray_directions.shape[0]):
+            dx, dy, dz = ray_directions[j, 0], ray_directions[j, 1], ray_directions[j, 2]
+
+            # Ray-sphere intersection, smaller root
+            a = dx * dx + dy * dy + dz * dz
+            b = 2 * (ox * dx + oy * dy + oz * dz)
+            discriminant = b * b - 4 * a * c
+            if discriminant >= 0:
+                t = (-b - math.sqrt(discriminant)) / (2 * a)
+                rx = r0[0] + t * dx - cx
+                ry = r0[1] + t * dy - cy
+                rz = r0[2] + t * dz - cz
+                norm = math.sqrt(rx * rx + ry * ry + rz * rz)
+                nx, ny, nz = rx / norm, ry / norm, rz / norm
+
+                # Fresnel reflectance and refracted direction
+                cos_theta_i = min(max(-(dx * nx + dy * ny + dz * nz), -1.0), 1.0)
+                theta_i = math.acos(cos_theta_i)
+                cos_theta_i = math.cos(theta_i)
+                cos_theta_r = math.cos(np.arcsin(eta * math.sin(theta_i)))
+                R = ((n_medium * cos_theta_i - n_particle * cos_theta_r) /
+                     (n_medium * cos_theta_i + n_particle * cos_theta_r))**2
+                T = 1 - R
+                k = eta * cos_theta_i - cos_theta_r
+
+                # Momentum transfer of reflection and transmission times the ray power
+                scale = momentum * ray_power[j]
+                px = (R * 2 * cos_theta_i * nx + T * (dx - eta * dx - k * nx)) * scale
+                py = (R * 2 * cos_theta_i * ny + T * (dy - eta * dy - k * ny)) * scale
+                pz = (R * 2 * cos_theta_i * nz + T * (dz - eta * dz - k * nz)) * scale
+                fx += px
+                fy += py
+                fz += pz
+                tx += ry * pz - rz * py
+                ty += rz * px - rx * pz
+                tz += rx * py - ry * px
+        F[i, 0], F[i, 1], F[i, 2] = fx, fy, fz
+        torque[i, 0], torque[i, 1], torque[i, 2] = tx, ty, tz
+
+
+# Same signature as numpy_trace_sum; max_pairs is not needed since no per-pair arrays are built
+def numba_trace_sum(radius, ray_directions, ray_power, n_medium, n_particle, sphere_centers, r0,
+                    multiple_scattering=False, power_threshold=POWER_THRESHOLD, max_pairs=MAX_RAY_POSITION_PAIRS):
+    if multiple_scattering:
+        return numpy_trace_sum(radius, ray_directions, ray_power, n_medium, n_particle, sphere_centers, r0,
+                               multiple_scattering, power_threshold, max_pairs)
+    F = np.zeros((len(sphere_centers), 3))
+    torque = np.zeros((len(sphere_centers), 3))
+    dtype = ray_directions.dtype
+    trace_sum_kernel(float(radius), np.ascontiguousarray(ray_directions), np.ascontiguousarray(ray_power, dtype=dtype),
+                     float(n_medium), float(n_particle), np.ascontiguousarray(sphere_centers, dtype=dtype),
+                     np.ascontiguousarray(r0, dtype=dtype), F, torque)
+    return F, torque
+
+
+register_backend("numba", numba_trace_sum)
@@ -1,16 +1,145 @@
+import functools
+import importlib
+import warnings
+from collections import OrderedDict
+
 import numpy as np
 
 from constants import SPEED_OF_LIGHT, LAMBDA
 
-# Discretize the laser beam into rays
-def generate_rays(num_rays, w0, P, beam_focus=np.array([0, 0, 0]), lambda_=LAMBDA):
+# Version of the force engine. Bump it whenever a change alters computed forces, so results cached
+# under the old version (result_cache) are no longer reused.
+ENGINE_VERSION = "2"
+
+# Sampling strategies for the ray bundle; "gauss" places deterministic quadrature rays with weights
+SAMPLING_MODES = ("uniform", "stratified", "halton", "sobol", "gauss")
+
+# Radical inverse of the integers in the given base (van der Corput sequence)
+def radical_inverse(indices, base):
+    indices = np.array(indices)
+    result = np.zeros(len(indices))
+    f = 1.0 / base
+    while np.any(indices > 0):
+        result += f * (indices % base)
+        indices //= base
+        f /= base
+    return result
+
+# Draw num_rays points in the unit cube [0, 1)^3 with the chosen sampling strategy.
+# rng selects the random source: None uses the global np.random state,
+# an integer seed or a np.random.Generator gives reproducible rays.
+def sample_unit_cube(num_rays, sampling="uniform", rng=None):
+    random = np.random if rng is None else np.random.default_rng(rng)
+    match sampling:
+        case "uniform":
+            return random.uniform(0, 1, (3, num_rays)).T
+        case "stratified":
+            # Jittered grid over the two angular coordinates (dimensions 1 and 2) with one ray per cell,
+            # rays that do not fill a complete grid are drawn uniformly so the estimate stays unbiased.
+            # The radial coordinate (dimension 0) is stratified on its own.
+            a = int(np.sqrt(num_rays))
+            b = num_rays // a if a > 0 else 0
+            cells = np.stack(np.meshgrid(np.arange(a), np.arange(b), indexing="ij"), axis=-1).reshape(-1, 2)
+            points = random.uniform(0, 1, (num_rays, 3))
+            points[:a * b, 1:] = (cells + points[:a * b, 1:]) / (a, b)
+            points[:, 0] = (random.permutation(num_rays) + points[:, 0]) / num_rays
+            return points
+        case "halton":
+            # Halton sequence in bases 2, 3, 5 with a random Cranley-Patterson shift
+            indices = np.arange(1, num_rays + 1)
+            points = np.array([radical_inverse(indices, base) for base in (2, 3, 5)]).T
+            return (points + random.uniform(0, 1, 3)) % 1.0
+        case "sobol":
+            try:
+                from scipy.stats import qmc
+            except ImportError:
+                raise ImportError("Sobol sampling requires scipy (pip install scipy)")
+            sobol = qmc.Sobol(d=3, scramble=True, seed=int(random.uniform(0, 2**31)))
+            with warnings.catch_warnings():
+                # Balance properties need a power of 2 points; the sequence is still low-discrepancy
+                warnings.simplefilter("ignore", UserWarning)
+                return sobol.random(num_rays)
+        case "gauss":
+            raise ValueError("Quadrature rays carry weights; use gauss_nodes or generate_rays")
+        case _:
+            raise ValueError(f"Unknown sampling mode {sampling!r}. Choose one of {SAMPLING_MODES}.")
+
+# Quadrature nodes in the unit cube and their weights (summing to 1): Gauss-Legendre nodes in the
+# divergence angle (dimension 1) times n_phi equally spaced azimuths (dimension 2, the trapezoidal
+# rule of a periodic integrand). About num_rays nodes are used; n_phi defaults to about sqrt(num_rays).
+# The radial position (dimension 0) does not enter the traced force and reuses the angular nodes.
+# indices selects a subset of the n_theta * n_phi nodes (all by default), e.g. one block of them.
+def gauss_nodes(num_rays, n_phi=None, indices=None):
+    n_theta, n_phi = gauss_grid_shape(num_rays, n_phi)
+    if indices is None:
+        indices = np.arange(n_theta * n_phi)
+    return quadrature_block(*legendre_nodes(n_theta), n_phi, indices)
+
+# Unit-cube points and weights of the nodes with the given indices on the grid of the
+# Legendre nodes x (weights w) times n_phi azimuths
+def quadrature_block(x, w, n_phi, indices):
+    i, j = np.divmod(indices, n_phi)
+    u_theta = (x[i] + 1) / 2
+    u_phi = (j + 0.5) / n_phi
+    weights = w[i] / 2 / n_phi
+    return np.stack((u_theta, u_theta, u_phi), axis=-1), weights
+
+# Gauss-Legendre nodes and weights on [-1, 1]. leggauss solves an n x n eigenproblem, so the nodes
+# are computed once per node count and shared (read-only) between calls.
+@functools.lru_cache(maxsize=16)
+def legendre_nodes(n):
+    x, w = np.polynomial.legendre.leggauss(n)
+    x.flags.writeable = False
+    w.flags.writeable = False
+    return x, w
+
+# Number of divergence-angle and azimuth nodes used by gauss_nodes for about num_rays rays
+def gauss_grid_shape(num_rays, n_phi=None):
+    if n_phi is None:
+        n_phi = max(1, int(np.sqrt(num_rays)))
+    return max(1, num_rays // n_phi), n_phi
+
+# Yield the points of sample_unit_cube (or the quadrature nodes) in blocks of at most block_size rays,
+# together with the quadrature weights of the block (None for the random modes).
+# Halton, Sobol and Gauss blocks continue one sequence; uniform blocks continue one random stream;
+# stratified blocks are stratified on their own.
+def unit_cube_blocks(num_rays, sampling="uniform", rng=None, block_size=2**16):
+    random = None if rng is None else np.random.default_rng(rng)
+    match sampling:
+        case "gauss":
+            n_theta, n_phi = gauss_grid_shape(num_rays)
+            x, w = legendre_nodes(n_theta)  # Shared by all blocks
+            for start in range(0, n_theta * n_phi, block_size):
+                yield quadrature_block(x, w, n_phi, np.arange(start, min(start + block_size, n_theta * n_phi)))
+        case "halton":
+            shift = (random or np.random).uniform(0, 1, 3)
+            for start in range(0, num_rays, block_size):
+                indices = np.arange(start + 1, min(start + block_size, num_rays) + 1)
+                points = np.array([radical_inverse(indices, base) for base in (2, 3, 5)]).T
+                yield (points + shift) % 1.0, None
+        case "sobol":
+            try:
+                from scipy.stats import qmc
+            except ImportError:
+                raise ImportError("Sobol sampling requires scipy (pip install scipy)")
+            sobol = qmc.Sobol(d=3, scramble=True, seed=int((random or np.random).uniform(0, 2**31)))
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", UserWarning)
+                for start in range(0, num_rays, block_size):
+                    yield sobol.random(min(block_size, num_rays - start)), None
+        case _:
+            for start in range(0, num_rays, block_size):
+                yield sample_unit_cube(min(block_size, num_rays - start), sampling, random), None
+
+# Rays for points u in the unit cube: radial position, divergence angle and azimuth
+def rays_from_unit_cube(u, w0, beam_focus=np.array([0, 0, 0]), lambda_=LAMBDA):
     # Divergence angle of the Gaussian beam
     theta = lambda_ / (np.pi * w0)  # Divergence angle (radians)
     
-    r = np.random.uniform(0, w0, num_rays)  # Radial position of rays
-    theta_ray = np.random.uniform(-theta, theta, num_rays)  # Angular divergence of rays
-    phi = np.random.uniform(0, 2 * np.pi, num_rays)  # Azimuthal angle of rays
-    power_per_ray = P / num_rays  # Power carried by each ray
+    r = w0 * u[:, 0]  # Radial position of rays
+    theta_ray = -theta + 2 * theta * u[:, 1]  # Angular divergence of rays
+    phi = 2 * np.pi * u[:, 2]  # Azimuthal angle of rays
+    num_rays = len(u)
     
     # Ray directions in 3D space
     dx = np.sin(theta_ray) * np.cos(phi)
@@ -26,79 +155,584 @@ def generate_rays(num_rays, w0, P, beam_focus=np.array([0, 0, 0]), lambda_=LAMBD
     ray_directions = np.vstack((dx, dy, dz)).T
     ray_directions /= np.linalg.norm(ray_directions, axis=1)[:, np.newaxis]
     
+    return x_beam, y_beam, z_beam, ray_directions
+
+# Discretize the laser beam into rays.
+# power_per_ray is a scalar for the random modes and a per-ray array for "gauss" quadrature rays.
+def generate_rays(num_rays, w0, P, beam_focus=np.array([0, 0, 0]), lambda_=LAMBDA, sampling="uniform", rng=None):
+    if sampling == "gauss":
+        u, weights = gauss_nodes(num_rays)
+        power_per_ray = P * weights  # Power carried by each ray
+    else:
+        u = sample_unit_cube(num_rays, sampling, rng)
+        power_per_ray = P / num_rays  # Power carried by each ray
+    
+    x_beam, y_beam, z_beam, ray_directions = rays_from_unit_cube(u, w0, beam_focus, lambda_)
     return x_beam, y_beam, z_beam, ray_directions, power_per_ray
 
-# Calculate momentum transfer for a single ray
-def momentum_transfer(ray_direction, intersection_point, sphere_center, n_medium, n_particle):
-    # Surface normal at the intersection point
-    n = (intersection_point - sphere_center) / np.linalg.norm(intersection_point - sphere_center)
+# Byte budget of the ray directions kept by get_rays (least recently used bundles are evicted first).
+# Bundles larger than RAY_CACHE_MAX_BUNDLE_BYTES (about 1.4e6 rays) are never cached.
+RAY_CACHE_MAX_BYTES = 2**27
+RAY_CACHE_MAX_BUNDLE_BYTES = 2**25
+_ray_cache = OrderedDict()
+
+# Bytes held by a cached (ray_directions, weights) bundle
+def cached_size(bundle):
+    ray_directions, weights = bundle
+    return ray_directions.nbytes + (0 if weights is None else weights.nbytes)
+
+# Return the ray directions and the power per ray for the beam parameters, reusing the cached directions
+# while they do not change. The power only scales the rays, so the cache does not depend on P.
+# With cache=False (or an explicit np.random.Generator as rng) fresh rays are drawn on every call.
+def get_rays(num_rays, w0, P, beam_focus=np.array([0, 0, 0]), lambda_=LAMBDA, sampling="uniform", rng=None,
+             cache=True):
+    if not cache or isinstance(rng, np.random.Generator):
+        _, _, _, ray_directions, power_per_ray = generate_rays(num_rays, w0, P, beam_focus, lambda_, sampling, rng)
+        return ray_directions, power_per_ray
+    
+    key = (num_rays, w0, tuple(np.asarray(beam_focus, dtype=float)), lambda_, sampling, rng)
+    bundle = _ray_cache.get(key)
+    if bundle is not None:
+        _ray_cache.move_to_end(key)
+    else:
+        # With P = 1 the power per ray of quadrature rays is their weight
+        _, _, _, ray_directions, unit_power = generate_rays(num_rays, w0, 1.0, beam_focus, lambda_, sampling, rng)
+        weights = unit_power if sampling == "gauss" else None
+        bundle = (ray_directions, weights)
+        if cached_size(bundle) <= RAY_CACHE_MAX_BUNDLE_BYTES:
+            ray_directions.flags.writeable = False  # Cached bundles are shared between callers
+            _ray_cache[key] = bundle
+            total = sum(cached_size(cached) for cached in _ray_cache.values())
+            while total > RAY_CACHE_MAX_BYTES:
+                _, evicted = _ray_cache.popitem(last=False)
+                total -= cached_size(evicted)
     
+    ray_directions, weights = bundle
+    power_per_ray = P / num_rays if weights is None else P * weights
+    return ray_directions, power_per_ray
+
+# Drop all cached ray bundles
+def clear_ray_cache():
+    _ray_cache.clear()
+
+# Fresnel reflectance and refracted direction of rays entering the sphere through the outward normal n
+def refract_into_sphere(ray_direction, n, n_medium, n_particle):
     # Angle of incidence
-    cos_theta_i = np.dot(-ray_direction, n)
+    cos_theta_i = np.sum(-ray_direction * n, axis=-1, keepdims=True)
     cos_theta_i = np.clip(cos_theta_i, -1.0, 1.0)  # Clamp to avoid numerical errors
     theta_i = np.arccos(cos_theta_i)
     
     # Snell's law for refraction
     theta_r = np.arcsin((n_medium / n_particle) * np.sin(theta_i))  # Angle of refraction
     
-    # Fresnel coefficients for reflection and transmission
+    # Fresnel coefficient for reflection
     R = ((n_medium * np.cos(theta_i) - n_particle * np.cos(theta_r)) /
          (n_medium * np.cos(theta_i) + n_particle * np.cos(theta_r)))**2
+    
+    # Direction of the transmitted ray inside the sphere
+    transmitted_direction = n_medium / n_particle * ray_direction + (n_medium / n_particle * np.cos(theta_i) - np.cos(theta_r)) * n
+    return R, np.cos(theta_i), transmitted_direction
+
+# Calculate momentum transfer for a single ray (or for many rays stacked along the leading axes)
+def momentum_transfer(ray_direction, intersection_point, sphere_center, n_medium, n_particle):
+    # Surface normal at the intersection point
+    n = intersection_point - sphere_center
+    n = n / np.linalg.norm(n, axis=-1, keepdims=True)
+    
+    # Fresnel coefficients for reflection and transmission
+    R, cos_theta_i, transmitted_direction = refract_into_sphere(ray_direction, n, n_medium, n_particle)
     T = 1 - R  # Transmission coefficient
     
     # Change in momentum due to reflection
-    delta_p_reflection = 2 * np.cos(theta_i) * n
+    delta_p_reflection = 2 * cos_theta_i * n
     
     # Change in momentum due to transmission
-    transmitted_direction = n_medium / n_particle * ray_direction + (n_medium / n_particle * np.cos(theta_i) - np.cos(theta_r)) * n
     delta_p_transmission = ray_direction - transmitted_direction
     
     # Total change in momentum
     delta_p = (R * delta_p_reflection + T * delta_p_transmission) * (n_medium / SPEED_OF_LIGHT)
     return delta_p
 
-# Calculate scattering force and torque
-def calculate_force_and_torque(radius, num_rays, w0, P, n_medium, n_particle, sphere_position, 
-                               beam_focus=np.array([0, 0, 0]), lambda_=LAMBDA):
-    x_beam, y_beam, z_beam, ray_directions, power_per_ray = generate_rays(num_rays, w0, P, beam_focus, lambda_)
-    F_scattering = np.zeros(3)  # Scattering force vector
-    torque = np.zeros(3)  # Torque vector
-    intersection_points = []  # Store intersection points for visualization
-    
-    for i in range(num_rays):
-        # Ray direction
-        d = ray_directions[i]
+# Default number of rays per block of the chunked tracing mode
+TRACE_CHUNK_SIZE = 2**16
+
+# Rays are followed inside the sphere until their power drops below this fraction of the incoming power
+POWER_THRESHOLD = 1e-3
+# Hard limit on the number of internal bounces per ray
+MAX_BOUNCES = 100
+
+# Follow the transmitted part of every hit ray through repeated internal reflections.
+# At each internal hit the fraction T leaves the sphere (refracted out) and R stays inside.
+# Returns the extra force and torque of the internal hits for every ray, using the same
+# n_medium / c momentum per unit power as the transmission term of momentum_transfer.
+def internal_bounces(radius, ray_direction, intersection_point, sphere_center, ray_power, n_medium, n_particle,
+                     power_threshold=POWER_THRESHOLD, max_bounces=MAX_BOUNCES):
+    force = np.zeros_like(intersection_point)
+    torque = np.zeros_like(intersection_point)
+    
+    n = (intersection_point - sphere_center) / np.linalg.norm(intersection_point - sphere_center, axis=-1, keepdims=True)
+    R, _, d = refract_into_sphere(ray_direction, n, n_medium, n_particle)
+    power = (1 - R) * ray_power  # Power carried inside the sphere
+    x = intersection_point
+    center = sphere_center
+    index = np.arange(len(x))  # Position of every live ray in the output arrays
+    threshold = power_threshold * ray_power
+    
+    for _ in range(max_bounces):
+        # Drop rays whose remaining power is below the threshold
+        alive = (power >= threshold)[:, 0]
+        if not alive.any():
+            break
+        d, x, center, power, index, threshold = d[alive], x[alive], center[alive], power[alive], index[alive], threshold[alive]
         
-        # Sphere center relative to beam focus
-        sphere_center = sphere_position - beam_focus
+        # Next hit on the sphere surface along the chord
+        x = x - 2 * np.sum((x - center) * d, axis=-1, keepdims=True) * d
+        n = (x - center) / radius
         
-        # Calculate intersection of ray with sphere
-        # Ray equation: r = r0 + t * d, where r0 is the ray origin (beam_focus), d is the ray direction
-        # Sphere equation: |r - sphere_center|^2 = radius^2
-        r0 = beam_focus
-        oc = r0 - sphere_center
-        a = np.dot(d, d)
-        b = 2 * np.dot(oc, d)
-        c = np.dot(oc, oc) - radius**2
-        discriminant = b**2 - 4 * a * c
+        # Fresnel coefficients leaving the sphere; sin_theta_t > 1 is total internal reflection
+        cos_theta_i = np.clip(np.sum(d * n, axis=-1, keepdims=True), -1.0, 1.0)
+        sin_theta_t = (n_particle / n_medium) * np.sqrt(1 - cos_theta_i**2)
+        cos_theta_t = np.sqrt(np.clip(1 - sin_theta_t**2, 0.0, 1.0))
+        R = ((n_particle * cos_theta_i - n_medium * cos_theta_t) /
+             (n_particle * cos_theta_i + n_medium * cos_theta_t))**2
+        R = np.where(sin_theta_t >= 1, 1.0, R)
+        T = 1 - R
         
-        if discriminant >= 0:  # Ray intersects the sphere
-            t = (-b - np.sqrt(discriminant)) / (2 * a)  # Use the smaller root for the first intersection
-            intersection_point = r0 + t * d
-            intersection_points.append(intersection_point)
-            
-            # Calculate momentum transfer
-            delta_p = momentum_transfer(d, intersection_point, sphere_center, n_medium, n_particle)
-            
-            # Force direction (positive of momentum change)
-            force_direction = +delta_p  # Positive of change in momentum (momentum conservation)
-            
-            # Scattering force (momentum transfer per unit time)
-            F_scattering += force_direction * power_per_ray
-            
-            # Torque (cross product of position vector and force)
-            position_vector = intersection_point - sphere_center
-            torque += np.cross(position_vector, force_direction * power_per_ray)
-    
-    return F_scattering, torque, intersection_points
+        # Reflected (internal) and refracted (outgoing) directions
+        reflected_direction = d - 2 * cos_theta_i * n
+        eta = n_particle / n_medium
+        outgoing_direction = eta * d - (eta * cos_theta_i - cos_theta_t) * n
+        
+        # Force is the incoming minus the outgoing momentum flux
+        f = power * (d - R * reflected_direction - T * outgoing_direction) * (n_medium / SPEED_OF_LIGHT)
+        force[index] += f
+        torque[index] += np.cross(x - center, f)
+        
+        d = reflected_direction
+        power = R * power
+    
+    return force, torque
 
+# Trace all rays against the sphere at once.
+# ray_directions has shape (..., num_rays, 3) and sphere_center broadcasts against it,
+# so a (N, 1, 3) array of centers traces the same rays for N sphere positions.
+# Returns per-ray force and torque (zero for rays that miss), the hit mask
+# and the first intersection point of every ray that hits.
+# With multiple_scattering the internal reflections of every ray are followed as well.
+def trace_rays(radius, ray_directions, ray_power, n_medium, n_particle, sphere_center, r0,
+               multiple_scattering=False, power_threshold=POWER_THRESHOLD):
+    d = ray_directions
+    
+    # Ray equation: r = r0 + t * d, sphere equation: |r - sphere_center|^2 = radius^2
+    oc = r0 - sphere_center
+    a = np.sum(d * d, axis=-1)
+    b = 2 * np.sum(oc * d, axis=-1)
+    c = np.sum(oc * oc, axis=-1) - radius**2
+    discriminant = b**2 - 4 * a * c
+    hit = discriminant >= 0  # Rays that intersect the sphere
+    
+    # Keep only the rays that hit, so the Fresnel part runs on a compact array
+    shape = hit.shape + (3,)
+    d_hit = np.broadcast_to(d, shape)[hit]
+    center_hit = np.broadcast_to(sphere_center, shape)[hit]
+    a_hit = np.broadcast_to(a, hit.shape)[hit]
+    b_hit = b[hit]
+    power_hit = np.broadcast_to(ray_power, hit.shape)[hit][:, np.newaxis]
+    
+    t = (-b_hit - np.sqrt(discriminant[hit])) / (2 * a_hit)  # Use the smaller root for the first intersection
+    intersection_points = r0 + t[:, np.newaxis] * d_hit
+    
+    # Force on the sphere (momentum transfer per unit time)
+    delta_p = momentum_transfer(d_hit, intersection_points, center_hit, n_medium, n_particle)
+    force_hit = delta_p * power_hit
+    
+    # Torque (cross product of position vector and force)
+    torque_hit = np.cross(intersection_points - center_hit, force_hit)
+    
+    if multiple_scattering:
+        force_internal, torque_internal = internal_bounces(radius, d_hit, intersection_points, center_hit, power_hit,
+                                                           n_medium, n_particle, power_threshold)
+        force_hit += force_internal
+        torque_hit += torque_internal
+    
+    force = np.zeros(shape, dtype=force_hit.dtype)
+    torque = np.zeros(shape, dtype=torque_hit.dtype)
+    force[hit] = force_hit
+    torque[hit] = torque_hit
+    return force, torque, hit, intersection_points
+
+# Force on a sphere centred on the beam axis with quadrature rays. By axial symmetry F_x, F_y and the
+# torque vanish and F_z does not depend on the azimuth, so a single azimuth is exact and F_z reduces
+# to a 1D Gauss-Legendre integral over the divergence angle. It uses as many nodes as the divergence
+# angle gets off the axis (about sqrt(num_rays)), not num_rays.
+def axisymmetric_force(radius, num_rays, w0, P, n_medium, n_particle, sphere_center, r0, lambda_=LAMBDA,
+                       multiple_scattering=False, power_threshold=POWER_THRESHOLD):
+    n_theta, _ = gauss_grid_shape(num_rays)
+    u, weights = gauss_nodes(n_theta, n_phi=1)
+    _, _, _, ray_directions = rays_from_unit_cube(u, w0, r0, lambda_)
+    force, _, _, intersection_points = trace_rays(radius, ray_directions, P * weights, n_medium, n_particle,
+                                                  sphere_center, r0, multiple_scattering, power_threshold)
+    F_scattering = np.array([0.0, 0.0, force[:, 2].sum()])
+    return F_scattering, np.zeros(3), intersection_points
+
+# Trace num_rays rays in blocks of chunk_size that are generated, traced and summed one at a time,
+# so peak memory depends on chunk_size and not on num_rays. dtype sets the precision of the traced
+# arrays; the sums are always accumulated in float64. The intersection points (K, 3) are only
+# collected with return_intersections, otherwise None is returned in their place.
+def trace_chunked(radius, num_rays, w0, P, n_medium, n_particle, sphere_center, r0, lambda_=LAMBDA,
+                  sampling="uniform", rng=None, chunk_size=TRACE_CHUNK_SIZE, dtype=np.float64,
+                  return_intersections=False, multiple_scattering=False, power_threshold=POWER_THRESHOLD,
+                  backend="numpy"):
+    sphere_center = sphere_center.astype(dtype)
+    r0_traced = r0.astype(dtype)
+    trace_sum = select_backend(backend, return_intersections)
+    
+    F_scattering = np.zeros(3)
+    torque = np.zeros(3)
+    intersections = [] if return_intersections else None
+    for u, weights in unit_cube_blocks(num_rays, sampling, rng, chunk_size):
+        _, _, _, ray_directions = rays_from_unit_cube(u, w0, r0, lambda_)
+        power = P / num_rays if weights is None else P * weights
+        if trace_sum is not None:
+            F_chunk, torque_chunk = trace_sum(radius, ray_directions.astype(dtype),
+                                              np.broadcast_to(np.asarray(power, dtype=dtype), len(u)),
+                                              n_medium, n_particle, sphere_center[np.newaxis], r0_traced,
+                                              multiple_scattering, power_threshold)
+            F_scattering += F_chunk[0]
+            torque += torque_chunk[0]
+            continue
+        force_chunk, torque_chunk, _, points = trace_rays(radius, ray_directions.astype(dtype),
+                                                          np.asarray(power, dtype=dtype), n_medium, n_particle,
+                                                          sphere_center, r0_traced, multiple_scattering,
+                                                          power_threshold)
+        F_scattering += force_chunk.sum(axis=0, dtype=np.float64)
+        torque += torque_chunk.sum(axis=0, dtype=np.float64)
+        if return_intersections:
+            intersections.append(points)
+    
+    if return_intersections:
+        intersections = np.concatenate(intersections) if intersections else np.zeros((0, 3), dtype=dtype)
+    return F_scattering, torque, intersections
+
+# Calculate scattering force and torque.
+# With chunk_size the rays are generated and traced in blocks of that many rays with bounded memory
+# (the ray cache is not used), and dtype=np.float32 halves the memory of the traced arrays.
+# return_intersections=False skips collecting the intersection points and returns None in their place;
+# only then is the trace run by a compute backend other than NumPy (see select_backend).
+def calculate_force_and_torque(radius, num_rays, w0, P, n_medium, n_particle, sphere_position, 
+                               beam_focus=np.array([0, 0, 0]), lambda_=LAMBDA, sampling="uniform", rng=None,
+                               cache_rays=True, multiple_scattering=False, power_threshold=POWER_THRESHOLD,
+                               chunk_size=None, dtype=np.float64, return_intersections=True, backend="numpy"):
+    # Sphere center relative to beam focus; all rays start at the beam focus
+    sphere_center = np.asarray(sphere_position, dtype=float) - beam_focus
+    r0 = np.asarray(beam_focus, dtype=float)
+    
+    # Bounded memory takes precedence over the on-axis quadrature shortcut
+    if chunk_size is not None:
+        return trace_chunked(radius, num_rays, w0, P, n_medium, n_particle, sphere_center, r0, lambda_, sampling,
+                             rng, chunk_size, dtype, return_intersections, multiple_scattering, power_threshold,
+                             backend)
+    
+    trace_sum = select_backend(backend, return_intersections)
+    
+    if sampling == "gauss" and np.all(np.abs(sphere_center[:2]) <= 1e-12 * radius):
+        F_scattering, torque, intersection_points = axisymmetric_force(radius, num_rays, w0, P, n_medium, n_particle,
+                                                                       sphere_center, r0, lambda_,
+                                                                       multiple_scattering, power_threshold)
+        return F_scattering, torque, intersection_points if return_intersections else None
+    
+    ray_directions, power_per_ray = get_rays(num_rays, w0, P, beam_focus, lambda_, sampling, rng, cache_rays)
+    if dtype != np.float64:
+        ray_directions = ray_directions.astype(dtype)
+        power_per_ray = np.asarray(power_per_ray, dtype=dtype)
+        sphere_center = sphere_center.astype(dtype)
+        r0 = r0.astype(dtype)
+    
+    if trace_sum is not None:
+        F_scattering, torque = trace_sum(radius, ray_directions, np.broadcast_to(power_per_ray, len(ray_directions)),
+                                         n_medium, n_particle, sphere_center[np.newaxis], r0,
+                                         multiple_scattering, power_threshold)
+        return F_scattering[0], torque[0], None
+    
+    force, torque, _, intersection_points = trace_rays(radius, ray_directions, power_per_ray,
+                                                       n_medium, n_particle, sphere_center, r0,
+                                                       multiple_scattering, power_threshold)
+    F_scattering = force.sum(axis=0, dtype=np.float64)  # Scattering force vector
+    torque = torque.sum(axis=0, dtype=np.float64)  # Torque vector
+    
+    return F_scattering, torque, intersection_points if return_intersections else None
+
+# Number of rays traced per batch by calculate_force_and_torque_streaming
+STREAM_BATCH_SIZE = 1024
+
+# Calculate force and torque with fresh batches of batch_size rays until the standard error of every
+# force component is at most tolerance (N) or max_rays rays have been traced.
+# Each ray is traced as if it carried the whole beam power, so the force is the mean of the per-ray
+# contributions; their running mean and variance are merged batch by batch (Chan et al.).
+# For the quasi-random modes each batch is an independently randomized point set and the per-ray
+# variance overestimates the error, so they stop conservatively. Returns (F, torque, F_stderr, num_rays).
+def calculate_force_and_torque_streaming(radius, max_rays, w0, P, n_medium, n_particle, sphere_position, tolerance,
+                                         batch_size=STREAM_BATCH_SIZE, beam_focus=np.array([0, 0, 0]),
+                                         lambda_=LAMBDA, sampling="uniform", rng=None, multiple_scattering=False,
+                                         power_threshold=POWER_THRESHOLD):
+    if sampling == "gauss":
+        raise ValueError("Quadrature rays have no statistical error; use calculate_force_and_torque")
+
+    sphere_center = np.asarray(sphere_position, dtype=float) - beam_focus
+    r0 = np.asarray(beam_focus, dtype=float)
+    # Successive batches must continue the random stream instead of repeating the same seed
+    random = None if rng is None else np.random.default_rng(rng)
+
+    num_rays = 0
+    F_mean = np.zeros(3)
+    F_m2 = np.zeros(3)  # Sum of squared deviations from the mean
+    torque_mean = np.zeros(3)
+    F_stderr = np.full(3, np.inf)
+    while num_rays < max_rays:
+        n = min(batch_size, max_rays - num_rays)
+        _, _, _, ray_directions, _ = generate_rays(n, w0, P, beam_focus, lambda_, sampling, random)
+        force, torque, _, _ = trace_rays(radius, ray_directions, P, n_medium, n_particle, sphere_center, r0,
+                                         multiple_scattering, power_threshold)
+
+        batch_mean = force.mean(axis=0)
+        total = num_rays + n
+        delta = batch_mean - F_mean
+        F_m2 += ((force - batch_mean)**2).sum(axis=0) + delta**2 * num_rays * n / total
+        F_mean += delta * n / total
+        torque_mean += (torque.mean(axis=0) - torque_mean) * n / total
+        num_rays = total
+
+        if num_rays > 1:
+            F_stderr = np.sqrt(F_m2 / (num_rays - 1) / num_rays)
+            if np.all(F_stderr <= tolerance):
+                break
+
+    return F_mean, torque_mean, F_stderr, num_rays
+
+# Upper bound on the number of (position, ray) pairs traced at once by the batched API
+MAX_RAY_POSITION_PAIRS = 2**20
+
+# Summed force and torque (N, 3) of the rays on N spheres (sphere_centers of shape (N, 3)) with NumPy.
+# This is the reference compute backend: the position and ray axes are processed in blocks so that
+# at most max_pairs (position, ray) pairs are in memory.
+def numpy_trace_sum(radius, ray_directions, ray_power, n_medium, n_particle, sphere_centers, r0,
+                    multiple_scattering=False, power_threshold=POWER_THRESHOLD, max_pairs=MAX_RAY_POSITION_PAIRS):
+    F_scattering = np.zeros((len(sphere_centers), 3))
+    torque = np.zeros((len(sphere_centers), 3))
+    if len(sphere_centers) == 0:
+        return F_scattering, torque
+    
+    position_chunk = min(len(sphere_centers), max_pairs)
+    chunk_size = max(1, max_pairs // position_chunk)
+    for first in range(0, len(sphere_centers), position_chunk):
+        centers = sphere_centers[first:first + position_chunk, np.newaxis, :]  # (n, 1, 3) broadcasts over rays
+        for start in range(0, len(ray_directions), chunk_size):
+            force_chunk, torque_chunk, _, _ = trace_rays(radius, ray_directions[start:start + chunk_size],
+                                                         ray_power[start:start + chunk_size],
+                                                         n_medium, n_particle, centers, r0,
+                                                         multiple_scattering, power_threshold)
+            F_scattering[first:first + position_chunk] += force_chunk.sum(axis=1, dtype=np.float64)
+            torque[first:first + position_chunk] += torque_chunk.sum(axis=1, dtype=np.float64)
+    
+    return F_scattering, torque
+
+# Compute backends for the summed ray trace. Every backend has the signature of numpy_trace_sum.
+# Optional backends live in their own module, which registers them with register_backend
+# when it is imported on first use; missing dependencies fall back to NumPy with a warning.
+BACKENDS = {"numpy": numpy_trace_sum}
+OPTIONAL_BACKENDS = {"numba": "numba_backend"}
+BACKEND_NAMES = tuple(BACKENDS) + tuple(OPTIONAL_BACKENDS)
+
+def register_backend(name, trace_sum):
+    BACKENDS[name] = trace_sum
+
+# Summed-trace function of the backend that replaces trace_rays in calculate_force_and_torque, or None
+# to trace with NumPy. The name is always validated; backends other than NumPy cannot return the
+# intersection points, so they are bypassed with a warning when these are requested.
+def select_backend(name, return_intersections):
+    trace_sum = get_backend(name)
+    if name == "numpy":
+        return None
+    if return_intersections:
+        warnings.warn(f"Compute backend {name!r} does not return intersection points; using NumPy "
+                      "(pass return_intersections=False to use it)")
+        return None
+    return trace_sum
+
+def get_backend(name="numpy"):
+    if name in BACKENDS:
+        return BACKENDS[name]
+    if name not in OPTIONAL_BACKENDS:
+        raise ValueError(f"Unknown compute backend {name!r}. Choose one of {BACKEND_NAMES}.")
+    try:
+        importlib.import_module(OPTIONAL_BACKENDS[name])
+    except ImportError as error:
+        warnings.warn(f"Compute backend {name!r} is not available ({error}); using NumPy")
+        BACKENDS[name] = numpy_trace_sum
+    return BACKENDS[name]
+
+# Calculate force and torque for an (N, 3) array of sphere positions with the same rays
+# using the chosen compute backend.
+def calculate_force_and_torque_batch(radius, num_rays, w0, P, n_medium, n_particle, sphere_positions,
+                                     beam_focus=np.array([0, 0, 0]), lambda_=LAMBDA, max_pairs=MAX_RAY_POSITION_PAIRS,
+                                     sampling="uniform", rng=None, cache_rays=True, multiple_scattering=False,
+                                     power_threshold=POWER_THRESHOLD, backend="numpy"):
+    ray_directions, power_per_ray = get_rays(num_rays, w0, P, beam_focus, lambda_, sampling, rng, cache_rays)
+    
+    sphere_positions = np.atleast_2d(np.asarray(sphere_positions, dtype=float))
+    sphere_centers = sphere_positions - beam_focus
+    r0 = np.asarray(beam_focus, dtype=float)
+    
+    ray_power = np.broadcast_to(power_per_ray, len(ray_directions))
+    
+    trace_sum = get_backend(backend)
+    return trace_sum(radius, ray_directions, ray_power, n_medium, n_particle, sphere_centers, r0,
+                     multiple_scattering, power_threshold, max_pairs)
+
+# Estimate the trap stiffness kappa = -dF_i/dx_i (N/m) along x, y and z around sphere_position
+# (usually the equilibrium position) by central finite differences of the force.
+# The same rays are traced at every offset, so most of the Monte Carlo noise cancels in the differences.
+# The step starts at step_fraction * radius and is halved until two successive estimates agree
+# within rtol (or their Monte Carlo error), at most max_halvings times.
+# Returns the stiffness values and their error bars, which combine the Monte Carlo standard error
+# with the Richardson estimate of the truncation error of the last step.
+def trap_stiffness(radius, num_rays, w0, P, n_medium, n_particle, sphere_position=np.array([0, 0, 0]),
+                   beam_focus=np.array([0, 0, 0]), lambda_=LAMBDA, step_fraction=0.05, rtol=0.05, max_halvings=3,
+                   sampling="uniform", rng=None, multiple_scattering=False, power_threshold=POWER_THRESHOLD):
+    ray_directions, power_per_ray = get_rays(num_rays, w0, P, beam_focus, lambda_, sampling, rng)
+    ray_power = np.broadcast_to(power_per_ray, len(ray_directions))
+    num_rays = len(ray_directions)
+    sphere_center = np.asarray(sphere_position, dtype=float) - beam_focus
+    r0 = np.asarray(beam_focus, dtype=float)
+    axes = np.arange(3)
+    
+    # Stiffness from the 6 offsets +-h along each axis and its Monte Carlo standard error
+    def stiffness(h):
+        offsets = np.concatenate((np.eye(3), -np.eye(3))) * h
+        centers = (sphere_center + offsets)[:, np.newaxis, :]
+        total = np.zeros(3)
+        total_sq = np.zeros(3)
+        chunk_size = max(1, MAX_RAY_POSITION_PAIRS // len(offsets))
+        for start in range(0, num_rays, chunk_size):
+            force, _, _, _ = trace_rays(radius, ray_directions[start:start + chunk_size],
+                                        ray_power[start:start + chunk_size], n_medium, n_particle, centers, r0,
+                                        multiple_scattering, power_threshold)
+            # Per-ray contributions to -dF_i/dx_i, shape (3, rays)
+            per_ray = -(force[axes, :, axes] - force[axes + 3, :, axes]) / (2 * h)
+            total += per_ray.sum(axis=1)
+            total_sq += (per_ray**2).sum(axis=1)
+        if sampling == "gauss":
+            return total, np.zeros(3)  # Quadrature has no Monte Carlo noise
+        variance = np.maximum(total_sq - total**2 / num_rays, 0) / max(num_rays - 1, 1)
+        return total, np.sqrt(num_rays * variance)
+    
+    h = step_fraction * radius
+    kappa, kappa_se = stiffness(h)
+    truncation = np.zeros(3)  # Unknown without a second step
+    for _ in range(max_halvings):
+        h /= 2
+        kappa_previous = kappa
+        kappa, kappa_se = stiffness(h)
+        truncation = np.abs(kappa - kappa_previous) / 3
+        if np.all(3 * truncation <= rtol * np.abs(kappa) + 2 * kappa_se):
+            break
+    
+    return kappa, np.sqrt(kappa_se**2 + truncation**2)
+
+# Find the root of f between a and b (f(a) and f(b) of opposite sign) with Brent's method.
+# f returns (value, standard_error); the search also stops once |value| <= noise_tolerance * standard_error,
+# since the root of a Monte Carlo estimate is not known better than its noise.
+# Returns the root and its (value, standard_error).
+def brent_root(f, a, b, fa, fb, xtol, max_iterations=100, noise_tolerance=1.0):
+    c, fc = b, fb
+    d = e = b - a
+    for _ in range(max_iterations):
+        if np.sign(fb[0]) == np.sign(fc[0]):
+            c, fc = a, fa
+            d = e = b - a
+        if abs(fc[0]) < abs(fb[0]):
+            a, b, c = b, c, b
+            fa, fb, fc = fb, fc, fb
+        tol = 2 * np.finfo(float).eps * abs(b) + 0.5 * xtol
+        xm = 0.5 * (c - b)
+        if abs(xm) <= tol or abs(fb[0]) <= noise_tolerance * fb[1]:
+            return b, fb
+        if abs(e) >= tol and abs(fa[0]) > abs(fb[0]):
+            # Inverse quadratic interpolation (secant step when only two points are known)
+            s = fb[0] / fa[0]
+            if a == c:
+                p = 2 * xm * s
+                q = 1 - s
+            else:
+                q = fa[0] / fc[0]
+                r = fb[0] / fc[0]
+                p = s * (2 * xm * q * (q - r) - (b - a) * (r - 1))
+                q = (q - 1) * (r - 1) * (s - 1)
+            if p > 0:
+                q = -q
+            p = abs(p)
+            if 2 * p < min(3 * xm * q - abs(tol * q), abs(e * q)):
+                e, d = d, p / q
+            else:
+                d = e = xm  # Interpolation failed, bisect
+        else:
+            d = e = xm  # Bounds decreasing too slowly, bisect
+        a, fa = b, fb
+        b += d if abs(d) > tol else np.copysign(tol, xm)
+        fb = f(b)
+    return b, fb
+
+# Find the axial equilibrium position of the sphere (F_z = 0) on the line through x0, y0 parallel
+# to the beam axis, starting from z0. F_z is traced with the same rays at every z, so it is a
+# smooth function of z; the root is bracketed by stepping downhill with growing steps and refined
+# with Brent's method down to xtol or the Monte Carlo noise of F_z.
+# Returns the equilibrium position, the force there (lateral components should be ~0 on axis)
+# and the number of force evaluations. Raises RuntimeError if a position is reached where no ray hits
+# the sphere, since F_z = 0 there does not mean a trap.
+def find_equilibrium(radius, num_rays, w0, P, n_medium, n_particle, z0=0.0, x0=0.0, y0=0.0,
+                     beam_focus=np.array([0, 0, 0]), lambda_=LAMBDA, xtol=1e-9, initial_step=None,
+                     max_evaluations=60, noise_tolerance=1.0, sampling="uniform", rng=None,
+                     multiple_scattering=False, power_threshold=POWER_THRESHOLD):
+    ray_directions, power_per_ray = get_rays(num_rays, w0, P, beam_focus, lambda_, sampling, rng)
+    r0 = np.asarray(beam_focus, dtype=float)
+    forces = {}  # Force and its standard error at every evaluated z
+    
+    def axial_force(z):
+        sphere_center = np.array([x0, y0, z], dtype=float) - beam_focus
+        force, _, hit, _ = trace_rays(radius, ray_directions, power_per_ray, n_medium, n_particle, sphere_center, r0,
+                                      multiple_scattering, power_threshold)
+        F = force.sum(axis=0)
+        if not np.any(hit) or not np.all(np.isfinite(F)):
+            # F_z = 0 because the sphere is outside the beam (or too far for the intersection to be
+            # resolved), not because it is trapped
+            raise RuntimeError(f"No ray hits the sphere at ({x0}, {y0}, {z}) m; no trap position can be found")
+        if sampling == "gauss" or len(force) < 2:
+            F_se = np.zeros(3)  # Quadrature has no Monte Carlo noise
+        else:
+            F_se = np.sqrt(len(force)) * force.std(axis=0, ddof=1)
+        forces[z] = (F, F_se)
+        return F[2], F_se[2]
+    
+    # Bracket the root: move in the direction of F_z (towards the trap) with doubling steps
+    step = radius / 4 if initial_step is None else initial_step
+    a, fa = z0, axial_force(z0)
+    b, fb = a, fa
+    while np.sign(fb[0]) == np.sign(fa[0]) and fb[0] != 0:
+        if len(forces) >= max_evaluations:
+            raise RuntimeError(f"No sign change of F_z found within {max_evaluations} evaluations")
+        a, fa = b, fb
+        b = a + np.sign(fa[0]) * step
+        fb = axial_force(b)
+        step *= 2
+    
+    if fb[0] == 0:
+        z = b
+    else:
+        z, _ = brent_root(axial_force, a, b, fa, fb, xtol, max_evaluations - len(forces), noise_tolerance)
+    
+    F, F_se = forces[z]
+    # F_z vanishes at the root, so round-off is measured against the momentum flux of the beam
+    if np.any(np.abs(F[:2]) > 3 * F_se[:2] + 1e-9 * n_medium * P / SPEED_OF_LIGHT):
+        warnings.warn(f"Lateral force {F[:2]} N at the axial equilibrium is not zero within its noise; "
+                      "the sphere is not at the lateral equilibrium")
+    return np.array([x0, y0, z]), F, len(forces)
@@ -33,14 +33,29 @@ class CalculationWindow:
             width=200, 
             height=30, 
             name="Select axis",  
-            choices=["X", "Y", "Z"],  
-            values=["X", "Y", "Z"],  
+            choices=["X", "Y", "Z", "XY", "XZ", "YZ", "XYZ"],  
+            values=["X", "Y", "Z", "XY", "XZ", "YZ", "XYZ"],  
             fontSize=30,  
             textColour=BLACK,  
             inactiveColour=GREY,  
             hoverColour=GREY  
         )
 
+        self.sampling_dropdown = Dropdown(
+            self.screen,
+            x=self.RIGHT_SIDE_X + 210,
+            y=50,
+            width=130,
+            height=30,
+            name="Sampling",
+            choices=["Uniform", "Stratified", "Halton", "Sobol", "Gauss"],
+            values=["uniform", "stratified", "halton", "sobol", "gauss"],
+            fontSize=30,
+            textColour=BLACK,
+            inactiveColour=GREY,
+            hoverColour=GREY
+        )
+
         # SpinBoxes (replacing sliders)
         self.beam_waist_spin_box = SpinBox(
             self.screen,  
@@ -170,6 +185,22 @@ class CalculationWindow:
         )
         self.path_label = self.font.render("Path to save:", True, BLACK)
 
+        # Output format: binary .npy results, optionally converted to CSV
+        self.format_dropdown = Dropdown(
+            self.screen,
+            x=self.RIGHT_SIDE_X + 210,
+            y=HEIGHT - 270,
+            width=130,
+            height=30,
+            name="Format",
+            choices=["NPY", "NPY + CSV"],
+            values=["npy", "csv"],
+            fontSize=20,
+            textColour=BLACK,
+            inactiveColour=GREY,
+            hoverColour=GREY
+        )
+
         # SpinBoxes for "Min point, µm" and "Max point, µm"
         self.min_point_label = self.slider_font.render("Min point, µm", True, BLACK)
         self.min_point_spin_box = SpinBox(
@@ -196,6 +227,20 @@ class CalculationWindow:
             initial_value=10  
         )
 
+        # SpinBox for the step between points (also used for every axis of plane and box maps)
+        self.step_label = self.slider_font.render("Step, µm", True, BLACK)
+        self.step_spin_box = SpinBox(
+            self.screen,
+            x=self.RIGHT_SIDE_X,
+            y=HEIGHT - 150,
+            width=200,
+            height=30,
+            min_value=0.1,
+            max_value=10,
+            step=0.1,
+            initial_value=0.5
+        )
+
         # Calculate and save results button
         self.calculate_button = Button(
             self.screen,
@@ -234,8 +279,10 @@ class CalculationWindow:
             self.screen.fill(WHITE)
             self.handle_events(events)
 
-            # Draw the dropdown
+            # Draw the dropdowns
             self.dropdown.draw()
+            self.sampling_dropdown.draw()
+            self.format_dropdown.draw()
 
             # Draw the spin boxes and their labels
             self.screen.blit(self.beam_waist_label, (self.SPIN_BOX_X, 20))
@@ -275,6 +322,9 @@ class CalculationWindow:
             self.min_point_spin_box.draw()
             self.screen.blit(self.max_point_label, (self.RIGHT_SIDE_X, HEIGHT - 240))
             self.max_point_spin_box.draw()
+            self.screen.blit(self.step_label, (self.RIGHT_SIDE_X, HEIGHT - 175))
+            self.step_spin_box.draw()
+            self.step_spin_box.listen(events)
 
             # Draw the calculate button
             self.calculate_button.draw()
@@ -309,6 +359,8 @@ class CalculationWindow:
         
         # Get the selected view
         dict_parameters['selected_view'] = self.dropdown.getSelected()
+        # Get the ray sampling strategy (uniform random if nothing is selected)
+        dict_parameters['sampling'] = self.sampling_dropdown.getSelected() or "uniform"
 
         # Get spin box values
         dict_parameters['w0'] = self.beam_waist_spin_box.getValue()
@@ -321,12 +373,16 @@ class CalculationWindow:
         dict_parameters['radius'] = self.radius_spin_box.getValue()
         dict_parameters['num_rays'] = self.num_rays_spin_box.getValue()
 
+        # Get the output format (binary .npy if nothing is selected)
+        dict_parameters['output_format'] = self.format_dropdown.getSelected() or "npy"
+
         # Get the save path
         dict_parameters['save_path'] = self.path_box.getText()
 
         # Get "Min point, µm" and "Max point, µm" values for the selected view
         dict_parameters['min_point'] = self.min_point_spin_box.getValue()
         dict_parameters['max_point'] = self.max_point_spin_box.getValue()
+        dict_parameters['step'] = self.step_spin_box.getValue()
         
         print(dict_parameters)
         # call the function to calculate and save the results
@@ -0,0 +1,74 @@
+import csv
+import time
+from collections import deque
+
+import numpy as np
+
+# Times the phases of each rendered frame. Call begin_frame at the top of the frame, lap(name) at the
+# end of every phase and end_frame at the bottom; each lap measures the time since the previous one.
+# The last window frames are kept for the mean/p95 overlay, and with a log path every frame is
+# appended as one CSV row (milliseconds per phase).
+class FrameProfiler:
+    def __init__(self, window=120):
+        self.window = window
+        self.history = {}  # Phase name -> deque of the last window durations (seconds)
+        self.current = {}
+        self.external = {}
+        self.last = None
+        self.frame = 0
+        self.log_file = None
+        self.log_writer = None
+        self.log_columns = None
+
+    def begin_frame(self):
+        self.current = {}
+        self.external = {}
+        self.last = time.perf_counter()
+
+    def lap(self, name):
+        now = time.perf_counter()
+        self.current[name] = self.current.get(name, 0.0) + now - self.last
+        self.last = now
+
+    def record(self, name, seconds):
+        # Add a duration measured elsewhere (e.g. the physics thread); it is not part of the frame time
+        self.external[name] = seconds
+
+    def end_frame(self):
+        self.frame += 1
+        self.current['frame'] = sum(self.current.values())
+        self.current.update(self.external)
+        for name, seconds in self.current.items():
+            self.history.setdefault(name, deque(maxlen=self.window)).append(seconds)
+        if self.log_writer is not None:
+            self.write_row()
+
+    def summary(self):
+        # (name, mean, p95) in seconds for every phase seen within the window
+        return [(name, float(np.mean(times)), float(np.percentile(times, 95)))
+                for name, times in self.history.items()]
+
+    def start_log(self, path):
+        self.stop_log()
+        self.log_file = open(path, "w", newline="")
+        self.log_writer = csv.writer(self.log_file)
+        self.log_columns = None
+
+    def stop_log(self):
+        if self.log_file is not None:
+            self.log_file.close()
+        self.log_file = None
+        self.log_writer = None
+
+    @property
+    def logging(self):
+        return self.log_writer is not None
+
+    def write_row(self):
+        # The columns are fixed by the first logged frame; phases missing in a frame are left empty
+        if self.log_columns is None:
+            self.log_columns = list(self.current)
+            self.log_writer.writerow(['frame', 'time'] + [f"{name}_ms" for name in self.log_columns])
+        row = [self.frame, f"{time.time():.6f}"]
+        row += ["" if name not in self.current else f"{1000 * self.current[name]:.3f}" for name in self.log_columns]
+        self.log_writer.writerow(row)
@@ -2,21 +2,23 @@ import pygame
 import numpy as np
 import math
 
-from constants import BOLTZMANN_CONSTANT, WIDTH, HEIGHT, BLUE, POINT_COLOR, CONE_COLOR
+from constants import WIDTH, HEIGHT, BLUE, POINT_COLOR, CONE_COLOR
 
 from optical_force import calculate_force_and_torque
+from brownian_ensemble import drag_coefficient, brownian_step_std
+
+# Largest sprite (pixels per side) cached by Sphere.draw; bigger discs are clipped to the screen instead
+MAX_SPRITE_SIZE = 2 * max(WIDTH, HEIGHT)
 
 class Sphere:
     def __init__(self, radius):
         self.pos = pygame.Vector3(0, 0, 0)
         self.radius = radius
+        self.sprite = None
+        self.sprite_key = None
 
     def brownian_motion(self, dt, temperature, viscosity):
-        radius_meters = self.radius * 1e-6
-        viscosity_pas = viscosity * 1e-3
-        D = (BOLTZMANN_CONSTANT * temperature * dt) / (6 * math.pi * viscosity_pas * radius_meters)
-        displacement_std = math.sqrt(2 * D * dt)
-        displacement_std_um = displacement_std * 1e6
+        displacement_std_um = brownian_step_std(self.radius, dt, temperature, viscosity)
         displacement = np.random.normal(0, displacement_std_um, 3)
         displacement = pygame.Vector3(displacement.tolist())
         self.pos += displacement
@@ -30,22 +32,44 @@ class Sphere:
             displacement_magnitude = min(displacement_length**2 * dt, displacement_length)
             self.pos += displacement_normalized * displacement_magnitude
 
-    def laser_trapping_force(self, dt, n_medium, n_particle, P, w0, viscosity, number_of_rays):
+    def laser_trapping_force(self, dt, n_medium, n_particle, P, w0, viscosity, number_of_rays, force_field=None,
+                             cache_rays=True, backend="numpy"):
         radius_meters = self.radius * 1e-6
-        viscosity_pas = viscosity * 1e-3
-        gamma = 6 * np.pi * viscosity_pas * radius_meters
-        F, torque, _ = calculate_force_and_torque(radius_meters, number_of_rays, w0, P, n_medium, n_particle, self.pos*1e-6)
+        gamma = drag_coefficient(self.radius, viscosity)
+        position = np.array(self.pos) * 1e-6
+        if force_field is None:
+            F, torque, _ = calculate_force_and_torque(radius_meters, number_of_rays, w0, P, n_medium, n_particle, position,
+                                                      cache_rays=cache_rays, return_intersections=False,
+                                                      backend=backend)
+        else:
+            # Interpolate a precomputed force field instead of tracing rays every frame
+            F, torque = force_field(radius_meters, number_of_rays, w0, P, n_medium, n_particle, position,
+                                    backend=backend)
         x = (F[0] / gamma) * dt * 1e6
         y = (F[1] / gamma) * dt * 1e6
         z = (F[2] / gamma) * dt * 1e6
         self.pos += pygame.Vector3(x, y, z)
 
+    # Draw the sphere and return the screen rectangle it covers (None if nothing was drawn).
+    # The translucent disc is rendered once per (radius, scale) into a sprite that is reused every frame.
     def draw(self, screen, mode, scale):
-        sphere_surface = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
         x, y = self.project_3d_to_2d(mode, scale)
-        if not (math.isnan(x) or math.isnan(y)):
-            pygame.draw.circle(sphere_surface, BLUE, (int(x), int(y)), int(self.radius * scale))
-            screen.blit(sphere_surface, (0, 0))
+        if math.isnan(x) or math.isnan(y):
+            return None
+        radius = int(self.radius * scale)
+        if 2 * radius + 1 > MAX_SPRITE_SIZE:
+            # Zoomed in too far for a sprite: render only the part of the disc on screen
+            clip = pygame.Rect(int(x) - radius, int(y) - radius, 2 * radius + 1, 2 * radius + 1).clip(screen.get_rect())
+            surface = pygame.Surface(clip.size, pygame.SRCALPHA)
+            pygame.draw.circle(surface, BLUE, (int(x) - clip.x, int(y) - clip.y), radius)
+            return screen.blit(surface, clip.topleft)
+
+        key = (self.radius, scale)
+        if key != self.sprite_key:
+            self.sprite = pygame.Surface((2 * radius + 1, 2 * radius + 1), pygame.SRCALPHA)
+            pygame.draw.circle(self.sprite, BLUE, (radius, radius), radius)
+            self.sprite_key = key
+        return screen.blit(self.sprite, (int(x) - radius, int(y) - radius))
 
     def project_3d_to_2d(self, mode, scale):
         if mode == "xy":
@@ -62,31 +86,47 @@ class Cones:
     def __init__(self):
         self.light_wavelength = 1.064
         self.height = 200
+        self.layer = None
+        self.layer_key = None
 
     def update_base_radius(self, beam_waist):
         angle = self.light_wavelength / (np.pi * beam_waist)
         self.base_radius = 2 * math.tan(angle) * self.height
 
+    # Draw the beam and return the screen rectangle it covers (None if nothing was drawn).
+    # The cones (or the focus point in the xy view) are rendered into a layer clipped to the screen
+    # that is reused until the view mode, scale or beam waist changes.
     def draw(self, screen, mode, scale, beam_waist, force_field):
         if force_field != "Laser Trapping Force":
             return None
-        self.update_base_radius(beam_waist)
+        key = (mode, scale, beam_waist)
+        if key != self.layer_key:
+            self.layer = self.render_layer(screen.get_rect(), mode, scale, beam_waist)
+            self.layer_key = key
+        surface, position = self.layer
+        return screen.blit(surface, position)
+
+    def render_layer(self, screen_rect, mode, scale, beam_waist):
         if mode == "xy":
-            point_surface = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
-            pygame.draw.circle(point_surface, POINT_COLOR, (WIDTH // 2, HEIGHT // 2), 3)
-            screen.blit(point_surface, (0, 0))
-        else:
-            cone_surface = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
-            base_radius = self.base_radius * scale
-            height = self.height * scale
-            pygame.draw.polygon(cone_surface, CONE_COLOR, [
-                (WIDTH // 2, HEIGHT // 2),
-                (WIDTH // 2 - base_radius, HEIGHT // 2 - height),
-                (WIDTH // 2 + base_radius, HEIGHT // 2 - height)
-            ])
-            pygame.draw.polygon(cone_surface, CONE_COLOR, [
-                (WIDTH // 2, HEIGHT // 2),
-                (WIDTH // 2 - base_radius, HEIGHT // 2 + height),
-                (WIDTH // 2 + base_radius, HEIGHT // 2 + height)
-            ])
-            screen.blit(cone_surface, (0, 0))
+            surface = pygame.Surface((7, 7), pygame.SRCALPHA)
+            pygame.draw.circle(surface, POINT_COLOR, (3, 3), 3)
+            return surface, (WIDTH // 2 - 3, HEIGHT // 2 - 3)
+
+        self.update_base_radius(beam_waist)
+        base_radius = self.base_radius * scale
+        height = self.height * scale
+        cones = [
+            [(WIDTH // 2, HEIGHT // 2),
+             (WIDTH // 2 - base_radius, HEIGHT // 2 - height),
+             (WIDTH // 2 + base_radius, HEIGHT // 2 - height)],
+            [(WIDTH // 2, HEIGHT // 2),
+             (WIDTH // 2 - base_radius, HEIGHT // 2 + height),
+             (WIDTH // 2 + base_radius, HEIGHT // 2 + height)],
+        ]
+        left, top = WIDTH // 2 - base_radius, HEIGHT // 2 - height
+        bounds = pygame.Rect(int(left), int(top), int(2 * base_radius) + 2, int(2 * height) + 2)
+        clip = bounds.clip(screen_rect)
+        surface = pygame.Surface(clip.size, pygame.SRCALPHA)
+        for cone in cones:
+            pygame.draw.polygon(surface, CONE_COLOR, [(px - clip.x, py - clip.y) for px, py in cone])
+        return surface, clip.topleft
@@ -0,0 +1,80 @@
+import queue
+import threading
+import time
+
+import pygame
+
+from .objects import Sphere
+
+# Runs the Brownian motion and force steps of the sphere on a background thread.
+# The UI hands over the latest slider values with set_parameters and reads the latest particle
+# state with get_state. Both are swapped in as whole objects (a single reference assignment),
+# so the render loop never waits for a slow force evaluation.
+class PhysicsWorker:
+    def __init__(self, radius):
+        self.sphere = Sphere(radius)  # Owned by the worker thread
+        self.parameters = None
+        # (position in µm, physics step time in seconds, {phase: seconds} of the last step)
+        self.state = (tuple(self.sphere.pos), 0.0, {})
+        self.positions = queue.SimpleQueue()  # Positions set from the UI (restart, manual input)
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name="physics", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+        self.thread = None
+
+    def set_parameters(self, parameters):
+        # parameters is a dict built by the UI; it is never modified after being handed over
+        self.parameters = parameters
+
+    def set_position(self, position):
+        self.positions.put(tuple(position))
+
+    def get_state(self):
+        return self.state
+
+    # Advance the sphere by one time step; returns the time spent in each phase
+    def step(self, parameters):
+        start = time.perf_counter()
+        dt = parameters['dt']
+        self.sphere.radius = parameters['radius']
+        self.sphere.brownian_motion(dt, parameters['temperature'], parameters['viscosity'])
+        brownian_done = time.perf_counter()
+
+        if parameters['force_mode'] == "Central Force":
+            self.sphere.central_force(dt)
+        elif parameters['force_mode'] == "Laser Trapping Force":
+            self.sphere.laser_trapping_force(dt, parameters['n_medium'], parameters['n_particle'], parameters['P'],
+                                             parameters['w0'], parameters['viscosity'], parameters['number_of_rays'],
+                                             parameters['force_field'], cache_rays=parameters['cache_rays'],
+                                             backend=parameters['backend'])
+        return {'brownian': brownian_done - start, 'force': time.perf_counter() - brownian_done}
+
+    def run(self):
+        while self.running:
+            start = time.perf_counter()
+            while not self.positions.empty():
+                self.sphere.pos = pygame.Vector3(self.positions.get())
+
+            parameters = self.parameters
+            if parameters is None or not parameters['active']:
+                self.state = (tuple(self.sphere.pos),) + self.state[1:]
+                time.sleep(0.01)
+                continue
+
+            phase_times = self.step(parameters)
+            step_time = time.perf_counter() - start
+            self.state = (tuple(self.sphere.pos), step_time, phase_times)
+
+            # One step per dt of wall-clock time; slower steps run back to back
+            remaining = parameters['dt'] - step_time
+            if remaining > 0:
+                time.sleep(remaining)
@@ -5,11 +5,20 @@ from pygame_widgets.button import Button
 from pygame_widgets.dropdown import Dropdown
 
 from .objects import Sphere, Cones
+from .physics_worker import PhysicsWorker
+from .frame_profiler import FrameProfiler
+from force_field import ForceField, ForceMemo
 from constants import HEIGHT, WIDTH, BLACK, WHITE, GREY, BLUE, ANOTHERBLUE
 
 
 class Simulation:
-    def __init__(self, return_to_menu_callback):
+    # Frame rate of the render loop; the physics thread runs at its own pace
+    RENDER_FPS = 60
+
+    # Per-frame timings are written to this file while logging is on (F4, or timing_log at start)
+    TIMING_LOG = "frame_timings.csv"
+
+    def __init__(self, return_to_menu_callback, timing_log=None):
         # pygame.init()
         self.screen = pygame.display.set_mode((WIDTH, HEIGHT))
         pygame.display.set_caption("3D Brownian Motion Simulation")
@@ -63,10 +72,48 @@ class Simulation:
                                        inactiveColour=BLACK,  
                                        hoverColour=ANOTHERBLUE)
 
+        self.engine_dropdown = Dropdown(self.screen, WIDTH - 150, 380, 100, 30,
+                                        name="Engine",
+                                        choices=["Grid", "Direct", "Fresh", "Memo"],
+                                        values=["Grid", "Direct", "Fresh", "Memo"],
+                                        fontSize=30,
+                                        textColour=BLACK,
+                                        inactiveColour=GREY,
+                                        hoverColour=GREY)
+
+        # Compute backend of the ray trace; "numba" falls back to NumPy if numba is not installed
+        self.backend_dropdown = Dropdown(self.screen, WIDTH - 260, 380, 100, 30,
+                                         name="Backend",
+                                         choices=["NumPy", "Numba"],
+                                         values=["numpy", "numba"],
+                                         fontSize=30,
+                                         textColour=BLACK,
+                                         inactiveColour=GREY,
+                                         hoverColour=GREY)
+
         # Sphere and Cones
         self.sphere = Sphere(self.radius_slider.getValue())
         self.cones = Cones()
 
+        # Lazily filled force field grid used by the "Grid" engine
+        self.force_field = ForceField()
+        # Forces memoized on a fine position lattice, used by the "Memo" engine
+        self.force_memo = ForceMemo()
+
+        # Physics runs on a background thread; self.sphere only mirrors its latest published position
+        self.physics = PhysicsWorker(self.radius_slider.getValue())
+
+        # Phase timings of every frame: F3 toggles the overlay, F4 toggles the CSV log
+        self.profiler = FrameProfiler()
+        self.show_profiler = False
+        self.timing_log = timing_log or self.TIMING_LOG
+        if timing_log is not None:
+            self.profiler.start_log(timing_log)
+
+        # Screen rectangles redrawn in the previous frame (None forces a full display update)
+        self.previous_dirty = None
+        self.had_events = True
+
         # Simulation state
         self.running = True
         self.simulation_active = True
@@ -77,6 +124,8 @@ class Simulation:
 
     def handle_events(self):
         events = pygame.event.get()
+        # Widgets only change in response to events; frames without any can skip the full display update
+        self.had_events = bool(events)
         for event in events:
             self.exit_button.listen(event)
             if event.type == pygame.QUIT:
@@ -84,6 +133,13 @@ class Simulation:
             elif event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_ESCAPE:
                     self.running = False
+                elif event.key == pygame.K_F3:
+                    self.show_profiler = not self.show_profiler
+                elif event.key == pygame.K_F4:
+                    if self.profiler.logging:
+                        self.profiler.stop_log()
+                    else:
+                        self.profiler.start_log(self.timing_log)
             if event.type == pygame.MOUSEBUTTONDOWN:
                 # Check if the current position window is clicked
                 window_rect = pygame.Rect(WIDTH - 200, HEIGHT - 100, 180, 80)
@@ -112,6 +168,7 @@ class Simulation:
                                     self.sphere.pos.y = value
                                 elif self.active_input == 2:
                                     self.sphere.pos.z = value
+                                self.physics.set_position(self.sphere.pos)
                             except ValueError:
                                 pass  # Ignore invalid input
                         self.active_input = None  # Finish editing
@@ -128,6 +185,7 @@ class Simulation:
             self.scale /= 1.05
         if self.restart_button.clicked:
             self.sphere.pos = pygame.Vector3(0, 0, 0)
+            self.physics.set_position(self.sphere.pos)
             self.simulation_active = True
             
         # Manual button click detection
@@ -137,12 +195,16 @@ class Simulation:
 
         if self.exit_button.clicked:
             self.running = False
+            self.physics.stop()
+            self.profiler.stop_log()
             self.return_to_menu_callback()  # Return to the menu
 
         # Update sliders
         self.sphere.radius = self.radius_slider.getValue()
+        self.profiler.lap("events")
         # Update widgets
         pygame_widgets.update(events)
+        self.profiler.lap("widgets")
 
     def draw_scale_bar(self):
         scale_length_pixels = 100
@@ -179,11 +241,27 @@ class Simulation:
             # Add abbreviation
             self.screen.blit(self.font.render("Current Position:", True, BLACK), 
                              (window_rect.x + 10, window_rect.y - 20))
+            return window_rect.inflate(0, 40)
 
     
     def draw_indicator(self, text):
         indicator_surface = self.font.render(text, True, BLACK)
-        self.screen.blit(indicator_surface, (5, HEIGHT - 30))
+        return self.screen.blit(indicator_surface, (5, HEIGHT - 30))
+
+    def draw_profiler(self):
+        # Rolling mean and 95th percentile of every frame phase and of the physics thread
+        rows = [f"{'phase':<10}{'mean':>8}{'p95':>8} ms"]
+        rows += [f"{name:<10}{1000 * mean:>8.2f}{1000 * p95:>8.2f}" for name, mean, p95 in self.profiler.summary()]
+        if self.engine_dropdown.getSelected() == "Memo":
+            rows.append(f"memo hits {100 * self.force_memo.hit_rate():.0f}% "
+                        f"({len(self.force_memo.cache)} entries)")
+        if self.profiler.logging:
+            rows.append(f"logging to {self.timing_log}")
+        panel = pygame.Surface((230, 20 * len(rows) + 10), pygame.SRCALPHA)
+        panel.fill((255, 255, 255, 200))
+        for i, row in enumerate(rows):
+            panel.blit(self.font.render(row, True, BLACK), (5, 5 + 20 * i))
+        return self.screen.blit(panel, (300, 60))
 
     def draw_slider_labels(self):
         # Draw labels above sliders with values in parentheses
@@ -203,47 +281,82 @@ class Simulation:
             label = self.font.render(f"{label_text} ({value:.2f})", True, BLACK)
             self.screen.blit(label, (slider.getX(), slider.getY() - 25))
 
+    def physics_parameters(self):
+        # Snapshot of the slider values handed over to the physics thread
+        engine = self.engine_dropdown.getSelected()
+        return {
+            'active': self.simulation_active,
+            'force_mode': self.force_dropdown.getSelected(),
+            'dt': self.dt_slider.getValue(),
+            'viscosity': self.viscosity_slider.getValue(),
+            'temperature': self.temperature_slider.getValue(),
+            'radius': self.radius_slider.getValue(),
+            'n_medium': self.n_medium_slider.getValue(),
+            'n_particle': self.n_particle_slider.getValue(),
+            'P': self.laser_power_slider.getValue() * 1e-3,
+            'w0': self.beam_waist_slider.getValue() * 1e-6,
+            'number_of_rays': int(self.number_of_rays_slider.getValue()),
+            # "Direct" traces the cached ray bundle every step, "Fresh" draws new rays every step,
+            # "Memo" looks up forces memoized per position lattice cell
+            'force_field': {"Direct": None, "Fresh": None, "Memo": self.force_memo}.get(engine, self.force_field),
+            'cache_rays': engine != "Fresh",
+            'backend': self.backend_dropdown.getSelected() or "numpy",
+        }
+
     def run(self):
         import time
+        self.physics.start()
         while self.running:
-            start = time.time()
+            start = time.perf_counter()
+            self.profiler.begin_frame()
             self.screen.fill(WHITE)
+            self.profiler.lap("clear")
             self.handle_events()
+            if not self.running:
+                break
 
-            if self.simulation_active:
-                dt = self.dt_slider.getValue()
-                viscosity = self.viscosity_slider.getValue()
-                temperature = self.temperature_slider.getValue()
-                self.sphere.brownian_motion(dt, temperature, viscosity)
-
-                if self.force_dropdown.getSelected() == "Central Force":
-                    self.sphere.central_force(dt)
-                elif self.force_dropdown.getSelected() == "Laser Trapping Force":
-                    n_medium = self.n_medium_slider.getValue()
-                    n_particle = self.n_particle_slider.getValue()
-                    P = self.laser_power_slider.getValue() * 1e-3
-                    w0 = self.beam_waist_slider.getValue() * 1e-6
-                    number_of_rays = int(self.number_of_rays_slider.getValue())
-                    self.sphere.laser_trapping_force(dt, n_medium, n_particle, P, w0, viscosity, number_of_rays)
-
-            self.cones.draw(self.screen, self.mode_dropdown.getSelected(), self.scale,
-                            self.beam_waist_slider.getValue(), self.force_dropdown.getSelected())
-            self.sphere.draw(self.screen, self.mode_dropdown.getSelected(), self.scale)
+            # Hand the latest slider values to the physics thread and pick up its latest state
+            self.physics.set_parameters(self.physics_parameters())
+            position, physics_time, physics_phases = self.physics.get_state()
+            self.sphere.pos = pygame.Vector3(position)
+            self.profiler.lap("state")
+            for name in ("brownian", "force"):
+                self.profiler.record(name, physics_phases.get(name, 0.0))
+
+            dirty = [
+                self.cones.draw(self.screen, self.mode_dropdown.getSelected(), self.scale,
+                                self.beam_waist_slider.getValue(), self.force_dropdown.getSelected()),
+                self.sphere.draw(self.screen, self.mode_dropdown.getSelected(), self.scale),
+            ]
+            self.profiler.lap("scene")
 
             self.draw_scale_bar()
-            self.draw_position_window()
+            dirty.append(self.draw_position_window())
             self.draw_slider_labels() 
 
-            end = int(1000 * (time.time() - start))
-            delta_time = int(self.dt_slider.getValue() * 1000) - end
-            delta_time = delta_time if delta_time > 0 else 0
-
-            string_to_show = f"step simulation time = {end} ms; dt = {int(self.dt_slider.getValue() * 1000)} ms."
-            string_to_show = "Real time: " + string_to_show if delta_time > 0 else "Not real time: " + string_to_show
-            self.draw_indicator(string_to_show if self.simulation_active else "Simulation is stopped...")
+            physics_ms = int(1000 * physics_time)
+            render_ms = int(1000 * (time.perf_counter() - start))
+            dt_ms = int(self.dt_slider.getValue() * 1000)
+            string_to_show = f"physics step = {physics_ms} ms; render = {render_ms} ms; dt = {dt_ms} ms."
+            string_to_show = "Real time: " + string_to_show if physics_ms < dt_ms else "Not real time: " + string_to_show
+            dirty.append(self.draw_indicator(string_to_show if self.simulation_active else "Simulation is stopped..."))
+            if self.show_profiler:
+                dirty.append(self.draw_profiler())
+            self.profiler.lap("overlay")
 
-            pygame.display.flip()
-            pygame.time.delay(delta_time)
-            # Also, the following can be used as well: self.clock.tick(int(self.dt_slider.getValue() * 1000))
+            # Only the moving parts change between frames without input: push the rectangles drawn
+            # in this and the previous frame instead of the whole window
+            dirty = [rect for rect in dirty if rect is not None]
+            if self.had_events or self.previous_dirty is None:
+                pygame.display.flip()
+            else:
+                pygame.display.update(dirty + self.previous_dirty)
+            self.previous_dirty = dirty
+            self.profiler.lap("flip")
+            self.clock.tick(self.RENDER_FPS)
+            self.profiler.lap("wait")
+            self.profiler.end_frame()
 
+        self.profiler.stop_log()
+        self.physics.stop()
         pygame.quit()
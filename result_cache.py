@@ -0,0 +1,138 @@
+import hashlib
+import itertools
+import json
+import os
+import shutil
+import tempfile
+import time
+import warnings
+
+from optical_force import ENGINE_VERSION
+
+# Default location and size limit of the on-disk result cache
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "optical-trap-results")
+CACHE_MAX_BYTES = 2**30
+
+# Keys of calc_and_save parameters that do not change the results and are left out of the hash
+UNHASHED_KEYS = ('save_path', 'workers')
+
+
+# Content address of a calc_and_save job: SHA-256 of its canonical JSON parameters and the engine version
+def job_key(dict_parameters):
+    hashed = {key: value for key, value in dict_parameters.items() if key not in UNHASHED_KEYS}
+    text = json.dumps({'parameters': hashed, 'engine_version': ENGINE_VERSION}, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+# Expand a parameter grid into calc_and_save jobs: every combination of the values listed in grid
+# (e.g. {'radius': [1e-6, 2e-6], 'P': [5e-3, 10e-3]}) on top of the base parameters
+def expand_grid(base, grid):
+    names = sorted(grid)
+    return [{**base, **dict(zip(names, values))} for values in itertools.product(*(grid[name] for name in names))]
+
+
+# Directory of result files keyed by job_key, one subdirectory per job holding the calc_and_save
+# output and a params.json. Entries are touched on every hit; when the total size exceeds max_bytes
+# the least recently used entries are deleted.
+class ResultCache:
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def entry_path(self, dict_parameters):
+        return os.path.join(self.directory, job_key(dict_parameters))
+
+    def get(self, dict_parameters):
+        # Directory with the cached results of the job, or None
+        path = self.entry_path(dict_parameters)
+        if not os.path.isdir(path):
+            return None
+        os.utime(path)  # Mark as recently used
+        return path
+
+    def run(self, dict_parameters):
+        # Results directory of the job and whether it came from the cache; the job is computed with
+        # calc_and_save on a miss. Returns (None, False) if calc_and_save rejected the parameters.
+        path = self.get(dict_parameters)
+        if path is not None:
+            self.hits += 1
+            return path, True
+        self.misses += 1
+
+        from calc_force_and_save import calc_and_save
+
+        # Compute into a scratch directory and move it into place, so a crash never leaves half an entry
+        scratch = tempfile.mkdtemp(prefix=".tmp-", dir=self.directory)
+        try:
+            saved = calc_and_save({**dict_parameters, 'save_path': scratch})
+            if saved:
+                with open(os.path.join(scratch, "params.json"), "w") as file:
+                    json.dump({'parameters': dict_parameters, 'engine_version': ENGINE_VERSION}, file, indent=4,
+                              default=str)
+        except BaseException:
+            shutil.rmtree(scratch, ignore_errors=True)
+            raise
+        if not saved:
+            shutil.rmtree(scratch)
+            return None, False
+
+        path = self.entry_path(dict_parameters)
+        try:
+            os.replace(scratch, path)
+        except OSError:
+            shutil.rmtree(scratch)  # Another process stored the same job first
+        self.evict(keep=path)
+        return path, False
+
+    def entries(self):
+        # (last use time, size in bytes, path) of every complete entry
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.startswith(".") or not os.path.isdir(path):
+                continue
+            size = sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+            entries.append((os.stat(path).st_mtime, size, path))
+        return entries
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self, keep=None):
+        # Delete least recently used entries until the cache fits into max_bytes; the entry keep
+        # (e.g. the one just stored) is never deleted
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+        if total > self.max_bytes and keep is not None:
+            warnings.warn(f"Result {keep} alone exceeds the cache size limit of {self.max_bytes} bytes")
+
+    def clear(self):
+        for _, _, path in self.entries():
+            shutil.rmtree(path, ignore_errors=True)
+
+
+# Run every cell of a parameter grid through the cache; only cells that are not cached are computed.
+# Returns a list of (parameters, results directory, cached) in grid order.
+def run_campaign(base, grid, cache=None):
+    cache = cache or ResultCache()
+    jobs = expand_grid(base, grid)
+    results = []
+    start = time.perf_counter()
+    for i, dict_parameters in enumerate(jobs):
+        path, cached = cache.run(dict_parameters)
+        results.append((dict_parameters, path, cached))
+        print(f"Job {i + 1}/{len(jobs)}: {'cached' if cached else 'computed'} {path}")
+    n_cached = sum(cached for _, _, cached in results)
+    print(f"Campaign finished in {time.perf_counter() - start:.1f} s "
+          f"({n_cached} cached, {len(results) - n_cached} computed)")
+    return results
@@ -0,0 +1,59 @@
+import json
+
+import numpy as np
+
+# Create a memory-mapped .npy array at path + ".npy" with a JSON metadata sidecar at path + ".json".
+# Rows can be filled incrementally; the data never has to fit in RAM.
+def open_result_array(path, shape, metadata, dtype=np.float64):
+    array = np.lib.format.open_memmap(f"{path}.npy", mode="w+", dtype=dtype, shape=shape)
+    write_metadata(path, metadata)
+    return array
+
+# Write the metadata sidecar of a result array
+def write_metadata(path, metadata):
+    with open(f"{path}.json", "w") as file:
+        json.dump(metadata, file, indent=4)
+
+# Streams rows into a preallocated memory-mapped (n_rows, len(columns)) .npy array.
+# The JSON header stores the metadata, the column names and whether all rows were written.
+class ResultWriter:
+    def __init__(self, path, n_rows, columns, metadata):
+        self.path = path
+        self.metadata = dict(metadata, columns=columns, complete=False)
+        self.array = open_result_array(path, (n_rows, len(columns)), self.metadata)
+        self.n_written = 0
+
+    def write(self, start, rows):
+        # Write a block of rows starting at row index start and flush it to disk
+        rows = np.atleast_2d(rows)
+        self.array[start:start + len(rows)] = rows
+        self.array.flush()
+        self.n_written += len(rows)
+
+    def append(self, rows):
+        self.write(self.n_written, rows)
+
+    def close(self):
+        self.array.flush()
+        self.metadata['complete'] = self.n_written == len(self.array)
+        write_metadata(self.path, self.metadata)
+
+# Load a result array as a read-only memory map together with its metadata.
+# path may be given with or without the .npy extension.
+def load_results(path):
+    path = str(path).removesuffix(".npy")
+    array = np.load(f"{path}.npy", mmap_mode="r")
+    with open(f"{path}.json") as file:
+        metadata = json.load(file)
+    return array, metadata
+
+# Convert a result array to CSV (path + ".csv" by default). 2D arrays keep their rows;
+# force maps are flattened to one row per grid position with the x, y, z coordinates first.
+def export_csv(path, csv_path=None):
+    path = str(path).removesuffix(".npy")
+    array, metadata = load_results(path)
+    if array.ndim > 2:
+        grid = np.meshgrid(metadata['x'], metadata['y'], metadata['z'], indexing="ij")
+        positions = np.stack([axis.ravel() for axis in grid], axis=-1)
+        array = np.hstack((positions, array.reshape(-1, array.shape[-1])))
+    np.savetxt(csv_path or f"{path}.csv", array, delimiter=",")
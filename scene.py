@@ -0,0 +1,141 @@
+import numpy as np
+
+from constants import LAMBDA
+from optical_force import get_rays, momentum_transfer
+from brownian_ensemble import BrownianEnsemble, drag_coefficient, brownian_step_std
+
+# Number of polar and azimuthal cells of the direction grid
+GRID_BINS = (64, 128)
+
+# Broad-phase index for rays that all start at one point. The ray directions are binned on a uniform
+# (polar angle, azimuth) grid. The rays whose line meets a sphere lie inside the cone the sphere subtends
+# at the origin, or inside the opposite cone because the first intersection may lie behind the origin.
+# Only the rays of the cells overlapping these cones are tested against the sphere.
+class DirectionGrid:
+    def __init__(self, ray_directions, bins=GRID_BINS):
+        self.n_polar, self.n_azimuth = bins
+        self.num_rays = len(ray_directions)
+        polar, azimuth = self.angles(ray_directions)
+        i = np.minimum((polar / np.pi * self.n_polar).astype(int), self.n_polar - 1)
+        j = np.minimum((azimuth / (2 * np.pi) * self.n_azimuth).astype(int), self.n_azimuth - 1)
+        cells = i * self.n_azimuth + j
+
+        # Rays sorted by cell; the rays of cell k are order[starts[k]:starts[k + 1]]
+        self.order = np.argsort(cells, kind="stable")
+        self.starts = np.searchsorted(cells[self.order], np.arange(self.n_polar * self.n_azimuth + 1))
+
+    @staticmethod
+    def angles(directions):
+        directions = np.atleast_2d(directions)
+        polar = np.arccos(np.clip(directions[:, 2], -1.0, 1.0))
+        azimuth = np.arctan2(directions[:, 1], directions[:, 0]) % (2 * np.pi)
+        return polar, azimuth
+
+    def cone_cells(self, axis, half_angle):
+        # Cells overlapping the cone of directions within half_angle of the unit vector axis
+        (polar,), (azimuth,) = self.angles(axis)
+        low, high = polar - half_angle, polar + half_angle
+        first_row = max(0, int(low / np.pi * self.n_polar))
+        last_row = min(self.n_polar - 1, int(high / np.pi * self.n_polar))
+        rows = np.arange(first_row, last_row + 1)
+        if low <= 0 or high >= np.pi:
+            columns = np.arange(self.n_azimuth)  # The cone contains a pole
+        else:
+            # Largest azimuth difference within a spherical cap that does not contain a pole
+            width = np.arcsin(np.sin(half_angle) / np.sin(polar))
+            first = int(np.floor((azimuth - width) / (2 * np.pi) * self.n_azimuth))
+            last = int(np.floor((azimuth + width) / (2 * np.pi) * self.n_azimuth))
+            columns = np.unique(np.arange(first, last + 1) % self.n_azimuth)
+        return (rows[:, np.newaxis] * self.n_azimuth + columns).ravel()
+
+    def candidates(self, center, radius):
+        # Indices of the rays whose line may meet the sphere at center (relative to the ray origin)
+        distance = np.linalg.norm(center)
+        if distance <= radius:
+            return np.arange(self.num_rays)  # The origin is inside the sphere
+        axis = center / distance
+        half_angle = np.arcsin(radius / distance) * (1 + 1e-9) + 1e-12  # Keep rays on a cell border
+        cells = np.union1d(self.cone_cells(axis, half_angle), self.cone_cells(-axis, half_angle))
+
+        # Gather the ragged ray ranges of all cells without a Python loop
+        begins = self.starts[cells]
+        counts = self.starts[cells + 1] - begins
+        offsets = np.repeat(begins - np.cumsum(counts) + counts, counts)
+        return self.order[offsets + np.arange(counts.sum())]
+
+
+# Force and torque on several spheres in the same beam. Every ray only acts on the first sphere it meets
+# (the smallest intersection parameter, as in trace_rays), so spheres shadow each other.
+# radii, n_particles and sphere_positions give one value (or row) per sphere, in m and SI units.
+# The broad phase (DirectionGrid) restricts the ray-sphere tests to the rays near each sphere, so the
+# cost follows the number of rays that can hit rather than rays x spheres. Single scattering only.
+# Returns the (K, 3) force and torque arrays.
+def calculate_scene_forces(radii, n_particles, sphere_positions, num_rays, w0, P, n_medium,
+                           beam_focus=np.array([0, 0, 0]), lambda_=LAMBDA, sampling="uniform", rng=None,
+                           cache_rays=True, bins=GRID_BINS):
+    ray_directions, power_per_ray = get_rays(num_rays, w0, P, beam_focus, lambda_, sampling, rng, cache_rays)
+    ray_power = np.broadcast_to(power_per_ray, len(ray_directions))
+
+    sphere_positions = np.atleast_2d(np.asarray(sphere_positions, dtype=float))
+    n_spheres = len(sphere_positions)
+    if n_spheres == 0:
+        return np.zeros((0, 3)), np.zeros((0, 3))
+    radii = np.broadcast_to(np.asarray(radii, dtype=float), n_spheres)
+    n_particles = np.broadcast_to(np.asarray(n_particles, dtype=float), n_spheres)
+    # Same convention as calculate_force_and_torque: centers relative to the focus, rays from r0
+    sphere_centers = sphere_positions - beam_focus
+    r0 = np.asarray(beam_focus, dtype=float)
+
+    # Broad phase: candidate (ray, sphere) pairs
+    grid = DirectionGrid(ray_directions, bins)
+    candidates = [grid.candidates(center - r0, radius) for center, radius in zip(sphere_centers, radii)]
+    pair_ray = np.concatenate(candidates)
+    pair_sphere = np.repeat(np.arange(n_spheres), [len(rays) for rays in candidates])
+
+    # Narrow phase: exact intersection of the candidate pairs
+    d = ray_directions[pair_ray]
+    center = sphere_centers[pair_sphere]
+    oc = r0 - center
+    a = np.sum(d * d, axis=-1)
+    b = 2 * np.sum(oc * d, axis=-1)
+    c = np.sum(oc * oc, axis=-1) - radii[pair_sphere]**2
+    discriminant = b**2 - 4 * a * c
+    hit = discriminant >= 0
+    pair_ray, pair_sphere, d, center = pair_ray[hit], pair_sphere[hit], d[hit], center[hit]
+    t = (-b[hit] - np.sqrt(discriminant[hit])) / (2 * a[hit])
+
+    # Keep the first sphere along every ray
+    order = np.lexsort((t, pair_ray))
+    first = order[np.r_[True, pair_ray[order][1:] != pair_ray[order][:-1]]] if len(order) else order
+    pair_ray, pair_sphere, d, center, t = pair_ray[first], pair_sphere[first], d[first], center[first], t[first]
+
+    intersection_points = r0 + t[:, np.newaxis] * d
+    delta_p = momentum_transfer(d, intersection_points, center, n_medium, n_particles[pair_sphere][:, np.newaxis])
+    force = delta_p * ray_power[pair_ray][:, np.newaxis]
+    torque = np.cross(intersection_points - center, force)
+
+    F = np.stack([np.bincount(pair_sphere, force[:, i], minlength=n_spheres) for i in range(3)], axis=-1)
+    torque = np.stack([np.bincount(pair_sphere, torque[:, i], minlength=n_spheres) for i in range(3)], axis=-1)
+    return F, torque
+
+
+# Several spheres of different radii (µm) and refractive indices sharing one trap, simulated without pygame.
+# Same units and overdamped dynamics as BrownianEnsemble, but the optical force comes from
+# calculate_scene_forces, so the particles shadow each other in the beam.
+class TrapScene(BrownianEnsemble):
+    def __init__(self, radii, n_particles, temperature, viscosity, n_medium, P, w0, num_rays, positions=None,
+                 seed=None, sampling="uniform"):
+        radii = np.asarray(radii, dtype=float)
+        super().__init__(len(radii), radii, temperature, viscosity, n_medium,
+                         np.broadcast_to(np.asarray(n_particles, dtype=float), len(radii)), P, w0, num_rays,
+                         positions=positions, seed=seed, sampling=sampling)
+
+    def brownian_motion(self, dt):
+        std = brownian_step_std(self.radius, dt, self.temperature, self.viscosity)
+        self.positions += self.rng.normal(0, 1, self.positions.shape) * std[:, np.newaxis]
+
+    def laser_trapping_force(self, dt):
+        gamma = drag_coefficient(self.radius, self.viscosity)
+        F, _ = calculate_scene_forces(self.radius * 1e-6, self.n_particle, self.positions * 1e-6, self.num_rays,
+                                      self.w0, self.P, self.n_medium, sampling=self.sampling, rng=self.seed)
+        self.positions += (F / gamma[:, np.newaxis]) * dt * 1e6